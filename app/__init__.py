@@ -1,5 +1,6 @@
 import os
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
@@ -7,7 +8,7 @@ from flask_migrate import Migrate
 db = SQLAlchemy()
 migrate = Migrate()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
 
     # SECRET KEY
@@ -25,20 +26,57 @@ def create_app():
 
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    # overrides for scripts/benchmarks (applied before extensions read config)
+    if config:
+        app.config.update(config)
+
+    # behind Render's proxy remote_addr is the proxy; trust this many X-Forwarded-For hops
+    trusted_proxies = int(os.environ.get("TRUSTED_PROXIES", 0))
+    if trusted_proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+
+    # ENGINE PROFILE (pool sizing, SQLite pragmas, fork safety)
+    from .db_profiles import configure_engine, install_engine_hooks
+    configure_engine(app)
+
     # INIT EXTENSIONS
     db.init_app(app)
     migrate.init_app(app, db)
+    install_engine_hooks(app)
+
+    from .metrics import metrics
+    metrics.init_app(app)
+
+    from .qr import qr_cache
+    qr_cache.init_app(app)
+
+    from .cache import catalog_cache
+    catalog_cache.init_app(app)
+
+    from .assets import assets
+    assets.init_app(app)
+
+    from .images import product_images
+    product_images.init_app(app)
 
     # LOGIN MANAGER
     login_manager = LoginManager()
     login_manager.login_view = "main.login"
     login_manager.init_app(app)
 
-    from .models import User
+    from .identity import identity_cache
+    identity_cache.init_app(app)
+
+    from .passwords import passwords
+    passwords.init_app(app)
+
+    from .idempotency import idempotency
+    idempotency.init_app(app)
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # cached id/phone/is_admin snapshot; the live row loads on demand
+        return identity_cache.load(int(user_id))
 
     # BLUEPRINTS
     from .routes import bp as main_bp
@@ -50,4 +88,12 @@ def create_app():
     from .utility_routes import utility
     app.register_blueprint(utility)
 
+    # TEMPLATE RESOLUTION (needs every blueprint's templates registered)
+    from .templating import template_resolver
+    template_resolver.init_app(app)
+
+    # CLI COMMANDS
+    from .commands import register_commands
+    register_commands(app)
+
     return app
\ No newline at end of file
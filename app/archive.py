@@ -0,0 +1,76 @@
+# app/archive.py
+"""Hot/cold split of the wallet ledger.
+
+wallet_transactions keeps only the last TRANSACTIONS_HOT_DAYS of rows;
+`flask transactions archive` moves anything older into
+wallet_transactions_archive in small id-ordered batches, so the hot table
+and its indexes stay a bounded size. Readers only touch the archive once a
+page reaches back past the hot horizon.
+"""
+import datetime
+import time
+
+from flask import current_app
+from sqlalchemy import literal, select
+
+from . import db
+from .models import WalletTransaction, WalletTransactionArchive
+
+# columns copied across (the archive adds archived_at)
+LEDGER_COLUMNS = ("id", "user_id", "type", "category", "reference", "amount", "created_at")
+
+
+def hot_horizon(now=None):
+    """Rows created on or after this are never in the archive."""
+    days = current_app.config.get("TRANSACTIONS_HOT_DAYS", 180)
+    return (now or datetime.datetime.utcnow()) - datetime.timedelta(days=days)
+
+
+def archive_batch(cutoff, size):
+    """Move up to size rows created before cutoff; commits and returns the count."""
+    hot = WalletTransaction.__table__
+    cold = WalletTransactionArchive.__table__
+
+    ids = db.session.execute(
+        select(hot.c.id).where(hot.c.created_at < cutoff).order_by(hot.c.id).limit(size)
+    ).scalars().all()
+    if not ids:
+        return 0
+
+    # copy and delete in one transaction: a row is always in exactly one table
+    db.session.execute(
+        cold.insert().from_select(
+            [*LEDGER_COLUMNS, "archived_at"],
+            select(
+                *(hot.c[name] for name in LEDGER_COLUMNS),
+                literal(datetime.datetime.utcnow(), cold.c.archived_at.type),
+            ).where(hot.c.id.in_(ids)),
+        )
+    )
+    db.session.execute(hot.delete().where(hot.c.id.in_(ids)))
+    db.session.commit()
+    return len(ids)
+
+
+def run_archive(cutoff, batch_size=1000, sleep=0.1, max_batches=None, progress=None):
+    """Archive everything before cutoff, sleeping between batches so the
+    live workload keeps the table; returns (rows moved, seconds taken).
+
+    cutoff may not be later than hot_horizon(): readers assume the archive
+    only holds rows older than that.
+    """
+    if cutoff > hot_horizon():
+        raise ValueError("archive cutoff is inside the TRANSACTIONS_HOT_DAYS window")
+    started = time.monotonic()
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, batch_size)
+        moved += count
+        batches += 1
+        if progress is not None:
+            progress(moved, time.monotonic() - started)
+        if count < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+    return moved, time.monotonic() - started
@@ -0,0 +1,229 @@
+# app/assets.py
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: .br variants are skipped without it
+    brotli = None
+
+MANIFEST = "manifest.json"
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+RASTER = {".png", ".jpg", ".jpeg"}
+# (Accept-Encoding token, file suffix), best first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class Assets:
+    """Fingerprinted, precompressed static files.
+
+    `flask assets build` writes content-hashed copies of app/static into
+    ASSETS_BUILD_DIR plus a manifest. With a manifest loaded, every
+    url_for('static', filename=...) points at the hashed name, and those
+    names are served with one-year immutable caching and a .br/.gz variant
+    when the client accepts it. Files missing from the manifest, or any
+    file while debugging, fall through to Flask's normal static handler.
+    """
+
+    def __init__(self):
+        self.build_dir = None
+        self.max_age = 31536000
+        self.manifest = {}
+        self.hashed = {}  # hashed name -> encodings built for it
+
+    def init_app(self, app):
+        app.config.setdefault("ASSETS_BUILD_DIR", os.path.join(app.instance_path, "assets"))
+        app.config.setdefault("ASSETS_MAX_AGE", 31536000)
+        app.config.setdefault("ASSETS_IMAGE_SIZES", (64, 128, 256))
+        app.config.setdefault("ASSETS_ENABLED", not app.debug)
+
+        self.build_dir = app.config["ASSETS_BUILD_DIR"]
+        self.max_age = app.config["ASSETS_MAX_AGE"]
+        if app.config["ASSETS_ENABLED"]:
+            self.load()
+
+        app.url_defaults(self._hash_static_url)
+        self._send_static = app.view_functions["static"]
+        app.view_functions["static"] = self.serve
+        app.jinja_env.globals["asset_url"] = self.url
+        app.extensions["assets"] = self
+
+    def load(self):
+        try:
+            with open(os.path.join(self.build_dir, MANIFEST)) as fh:
+                self.manifest = json.load(fh)
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.hashed = {}
+        for entry in self.manifest.values():
+            self.hashed[entry["file"]] = entry.get("encodings", [])
+            for sizes in entry.get("variants", {}).values():
+                for name in sizes.values():
+                    self.hashed[name] = []
+
+    # -- URLs --------------------------------------------------------------
+
+    def _hash_static_url(self, endpoint, values):
+        if endpoint == "static" and self.manifest:
+            entry = self.manifest.get(values.get("filename"))
+            if entry is not None:
+                values["filename"] = entry["file"]
+
+    def url(self, filename, size=None, fmt=None):
+        """url_for('static', ...) that can also pick a resized image variant.
+
+        size is the rendered pixel width wanted (pass 2x for retina); fmt is
+        "webp" or "png". Without a build this is just url_for('static').
+        """
+        entry = self.manifest.get(filename)
+        if entry is None or (size is None and fmt is None):
+            return url_for("static", filename=filename)
+
+        variants = entry.get("variants", {}).get(fmt or os.path.splitext(filename)[1][1:], {})
+        widths = sorted(int(w) for w in variants)
+        if not widths:
+            return url_for("static", filename=filename)
+        fits = [w for w in widths if size is None or w >= size]
+        return url_for("static", filename=variants[str(fits[0] if fits else widths[-1])])
+
+    # -- serving -----------------------------------------------------------
+
+    def serve(self, filename):
+        if filename not in self.hashed:
+            return self._send_static(filename=filename)
+
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        encoding = None
+        for token, suffix in ENCODINGS:
+            if token in self.hashed[filename] and request.accept_encodings[token]:
+                encoding = (token, suffix)
+                break
+
+        name = filename + (encoding[1] if encoding else "")
+        resp = send_from_directory(self.build_dir, name, mimetype=mimetype, max_age=self.max_age)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding[0]
+        if self.hashed[filename]:
+            resp.vary.add("Accept-Encoding")
+        # the name changes whenever the content does, so never revalidate
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
+
+
+assets = Assets()
+
+
+# ---------------------------------------------------------
+# BUILD
+# ---------------------------------------------------------
+
+def _fingerprint(rel_path, data):
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def _write(build_dir, rel_path, data):
+    path = os.path.join(build_dir, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(data)
+
+
+def _compressed(data):
+    """{suffix: bytes} for encodings that actually make the file smaller."""
+    out = {}
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=9, mtime=0) as gz:
+        gz.write(data)
+    out[".gz"] = buf.getvalue()
+    if brotli is not None:
+        out[".br"] = brotli.compress(data, quality=11)
+    return {suffix: blob for suffix, blob in out.items() if len(blob) < len(data)}
+
+
+def _encode_image(image, fmt):
+    buf = io.BytesIO()
+    if fmt == "webp":
+        image.save(buf, "WEBP", quality=85, method=6)
+    else:
+        image.save(buf, "PNG", optimize=True)
+    return buf.getvalue()
+
+
+def _build_image(build_dir, rel_path, data, sizes):
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+
+    # the canonical file is re-encoded only if that saves bytes
+    optimized = _encode_image(image, "png") if rel_path.lower().endswith(".png") else data
+    if len(optimized) >= len(data):
+        optimized = data
+    entry = {"file": _fingerprint(rel_path, optimized), "variants": {"png": {}, "webp": {}}}
+    _write(build_dir, entry["file"], optimized)
+
+    root, _ = os.path.splitext(rel_path)
+    for width in sorted(set(sizes) | {image.width}):
+        if width > image.width:
+            continue
+        resized = image if width == image.width else image.resize(
+            (width, round(image.height * width / image.width)), Image.LANCZOS
+        )
+        for fmt in ("png", "webp"):
+            blob = _encode_image(resized, fmt)
+            name = _fingerprint(f"{root}-{width}.{fmt}", blob)
+            _write(build_dir, name, blob)
+            entry["variants"][fmt][str(width)] = name
+    return entry
+
+
+def build(app):
+    """Fingerprint/compress app.static_folder into ASSETS_BUILD_DIR; returns the manifest.
+
+    Earlier builds' files are left in place so pages already cached by
+    clients keep resolving their old URLs.
+    """
+    source = app.static_folder
+    build_dir = app.config["ASSETS_BUILD_DIR"]
+    sizes = app.config["ASSETS_IMAGE_SIZES"]
+    manifest = {}
+
+    for dirpath, _, filenames in os.walk(source):
+        for filename in sorted(filenames):
+            full = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(full, source).replace(os.sep, "/")
+            ext = os.path.splitext(filename)[1].lower()
+            with open(full, "rb") as fh:
+                data = fh.read()
+
+            if ext in RASTER:
+                manifest[rel_path] = _build_image(build_dir, rel_path, data, sizes)
+                continue
+
+            entry = {"file": _fingerprint(rel_path, data), "encodings": []}
+            _write(build_dir, entry["file"], data)
+            if ext in COMPRESSIBLE:
+                variants = _compressed(data)
+                for token, suffix in ENCODINGS:
+                    if suffix in variants:
+                        _write(build_dir, entry["file"] + suffix, variants[suffix])
+                        entry["encodings"].append(token)
+            manifest[rel_path] = entry
+
+    # manifest last, written atomically: a half-finished build is never picked up
+    tmp = os.path.join(build_dir, MANIFEST + ".tmp")
+    os.makedirs(build_dir, exist_ok=True)
+    with open(tmp, "w") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(build_dir, MANIFEST))
+    return manifest
@@ -0,0 +1,251 @@
+# app/backfill.py
+"""Resumable, throttled data backfills for live tables.
+
+A Backfill walks one table's integer primary key in ranges of batch_size
+rows. Each range is processed and checkpointed in backfill_progress in
+one short transaction, so no lock is held for longer than a batch and a
+run can stop at any point (Ctrl-C, a deploy, a crash) and pick up where
+it left off. Chunk functions must be safe to re-run on a range.
+
+From a migration, commit the schema change first and run outside the
+migration's own transaction, e.g. for a Float -> integer cents column:
+
+    from app.backfill import Backfill, set_column
+
+    def upgrade():
+        op.add_column("wallet_transactions", sa.Column("amount_cents", sa.BigInteger()))
+        with op.get_context().autocommit_block():
+            Backfill(
+                "wallet_transactions.amount_cents", "wallet_transactions",
+                set_column("amount_cents", "round(amount * 100)"),
+            ).run(op.get_bind().engine)
+
+Registered backfills (BACKFILLS) can also be run or resumed with
+`flask backfill run <name>`.
+"""
+import datetime
+import logging
+import time
+
+import sqlalchemy as sa
+
+log = logging.getLogger("app.backfill")
+
+# lightweight table, so migrations don't depend on the current models
+PROGRESS = sa.table(
+    "backfill_progress",
+    sa.column("name", sa.String), sa.column("last_id", sa.BigInteger),
+    sa.column("max_id", sa.BigInteger), sa.column("rows_done", sa.BigInteger),
+    sa.column("batches", sa.Integer), sa.column("started_at", sa.DateTime),
+    sa.column("updated_at", sa.DateTime), sa.column("finished_at", sa.DateTime),
+)
+
+
+class Backfill:
+    """A named, checkpointed pass over `table` in primary-key order.
+
+    chunk(conn, table, lo, hi) updates rows with lo < pk <= hi and returns
+    how many it touched; `table` is a lightweight sa.table with just the pk.
+    """
+
+    def __init__(self, name, table, chunk, pk="id", batch_size=1000, sleep=0.0,
+                 report_interval=5.0):
+        self.name = name
+        self.table = sa.table(table, sa.column(pk))
+        self.pk = self.table.c[pk]
+        self.chunk = chunk
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.report_interval = report_interval
+
+    def status(self, conn):
+        """The checkpoint row as a dict, or None if it has never run."""
+        row = conn.execute(sa.select(PROGRESS).where(PROGRESS.c.name == self.name)).mappings().first()
+        return dict(row) if row else None
+
+    def run(self, engine, batch_size=None, sleep=None, restart=False, max_batches=None, progress=None):
+        """Process the remaining ranges; returns the checkpoint dict.
+
+        The upper bound starts as the table's max pk; when the run gets
+        there it looks again and carries on while newer rows exist, so rows
+        written by old code during a deploy are covered too. A finished
+        backfill that is run again picks up rows added since. progress(state,
+        rows_per_second) is called every report_interval seconds and once at
+        the end.
+        """
+        batch_size = batch_size or self.batch_size
+        sleep = self.sleep if sleep is None else sleep
+        state = self._start(engine, restart)
+        started = last_report = time.monotonic()
+        rows_here = batches_here = 0
+
+        while state["finished_at"] is None and (max_batches is None or batches_here < max_batches):
+            with engine.begin() as conn:
+                state = self._locked_status(conn)
+                hi = self._next_bound(conn, state["last_id"], state["max_id"], batch_size)
+                now = datetime.datetime.utcnow()
+                if hi is None:
+                    max_id = self._max_id(conn)
+                    if max_id > state["max_id"]:
+                        # rows arrived since the bound was taken; keep going
+                        state.update(max_id=max_id, updated_at=now)
+                        conn.execute(self._save(state))
+                        continue
+                    state.update(finished_at=now, updated_at=now)
+                    conn.execute(self._save(state))
+                    break
+                rows = self.chunk(conn, self.table, state["last_id"], hi) or 0
+                state.update(
+                    last_id=hi, rows_done=state["rows_done"] + rows,
+                    batches=state["batches"] + 1, updated_at=now,
+                )
+                conn.execute(self._save(state))
+
+            rows_here += rows
+            batches_here += 1
+            if time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                self._report(state, rows_here / (last_report - started), progress)
+            if sleep:
+                time.sleep(sleep)
+
+        elapsed = time.monotonic() - started
+        self._report(state, rows_here / elapsed if elapsed else 0.0, progress)
+        return state
+
+    # -- internals -----------------------------------------------------------
+
+    def _start(self, engine, restart):
+        with engine.begin() as conn:
+            state = self.status(conn)
+            if state is not None and not restart:
+                max_id = self._max_id(conn)
+                if state["finished_at"] is not None and max_id > state["max_id"]:
+                    # finished before newer rows landed: reopen for just those
+                    state.update(max_id=max_id, finished_at=None, updated_at=datetime.datetime.utcnow())
+                    conn.execute(self._save(state))
+                return state
+            if state is not None:
+                conn.execute(PROGRESS.delete().where(PROGRESS.c.name == self.name))
+            now = datetime.datetime.utcnow()
+            state = {
+                "name": self.name, "last_id": 0,
+                "max_id": self._max_id(conn),
+                "rows_done": 0, "batches": 0,
+                "started_at": now, "updated_at": now, "finished_at": None,
+            }
+            conn.execute(PROGRESS.insert().values(**state))
+            return state
+
+    def _max_id(self, conn):
+        return conn.execute(sa.select(sa.func.max(self.pk))).scalar() or 0
+
+    def _locked_status(self, conn):
+        # two runners of the same backfill take turns instead of redoing ranges
+        # (FOR UPDATE is a no-op on SQLite, where writers are serialized anyway)
+        row = conn.execute(
+            sa.select(PROGRESS).where(PROGRESS.c.name == self.name).with_for_update()
+        ).mappings().one()
+        return dict(row)
+
+    def _next_bound(self, conn, last_id, max_id, batch_size):
+        """pk of the batch_size-th row after last_id (an index seek, so gaps
+        in the id space cost nothing), capped at max_id; None when done."""
+        if last_id >= max_id:
+            return None
+        hi = conn.execute(
+            sa.select(self.pk)
+            .where(self.pk > last_id, self.pk <= max_id)
+            .order_by(self.pk)
+            .offset(batch_size - 1)
+            .limit(1)
+        ).scalar()
+        return max_id if hi is None else hi
+
+    def _save(self, state):
+        return PROGRESS.update().where(PROGRESS.c.name == self.name).values(
+            last_id=state["last_id"], max_id=state["max_id"],
+            rows_done=state["rows_done"], batches=state["batches"],
+            updated_at=state["updated_at"], finished_at=state["finished_at"],
+        )
+
+    def _report(self, state, rate, progress):
+        log.info(
+            "backfill %s: %s rows, id %s/%s, %.0f rows/s",
+            self.name, state["rows_done"], state["last_id"], state["max_id"], rate,
+        )
+        if progress is not None:
+            progress(state, rate)
+
+
+def set_column(column, expression, only_null=True):
+    """Chunk function for `UPDATE ... SET column = <SQL expression>`.
+
+    only_null skips rows already filled in, e.g. by application code that
+    writes both the old and the new column while the backfill runs.
+    """
+    def chunk(conn, table, lo, hi):
+        pk_name = next(iter(table.c)).name
+        target = sa.table(table.name, sa.column(pk_name), sa.column(column))
+        pk = target.c[pk_name]
+        stmt = target.update().where(pk > lo, pk <= hi).values(
+            {column: sa.literal_column(expression)}
+        )
+        if only_null:
+            stmt = stmt.where(target.c[column].is_(None))
+        return conn.execute(stmt).rowcount
+    return chunk
+
+
+# ---------------------------------------------------------
+# REGISTERED BACKFILLS (flask backfill run <name>)
+# ---------------------------------------------------------
+
+BACKFILLS = {}
+
+
+def register(backfill):
+    BACKFILLS[backfill.name] = backfill
+    return backfill
+
+
+def _categorize_ledger(conn, table, lo, hi):
+    """Fill category/reference for ledger rows written without them, and
+    roll any spend into daily_spend (each row is categorized exactly once)."""
+    from .wallet import SPEND_CATEGORIES, categorize, daily_spend_upsert
+
+    ledger = sa.table(
+        table.name, sa.column("id"), sa.column("user_id"), sa.column("type"),
+        sa.column("amount"), sa.column("created_at", sa.DateTime),
+        sa.column("category"), sa.column("reference"),
+    )
+    rows = conn.execute(
+        sa.select(ledger.c.id, ledger.c.user_id, ledger.c.type, ledger.c.amount, ledger.c.created_at)
+        .where(ledger.c.id > lo, ledger.c.id <= hi, ledger.c.category.is_(None))
+    ).all()
+    if not rows:
+        return 0
+
+    params = []
+    spend = {}  # (user_id, day, category) -> [spent, count]
+    for row in rows:
+        category, reference = categorize(row.type, row.amount)
+        params.append({"row_id": row.id, "new_category": category, "new_reference": reference})
+        if category in SPEND_CATEGORIES and row.created_at is not None:
+            totals = spend.setdefault((row.user_id, row.created_at.date(), category), [0.0, 0])
+            totals[0] -= row.amount or 0
+            totals[1] += (row.amount or 0) < 0
+    for (user_id, day, category), (spent, count) in spend.items():
+        conn.execute(daily_spend_upsert(conn.dialect.name, user_id, day, category, spent, count))
+    conn.execute(
+        ledger.update().where(ledger.c.id == sa.bindparam("row_id")).values(
+            category=sa.bindparam("new_category"), reference=sa.bindparam("new_reference"),
+        ),
+        params,
+    )
+    return len(rows)
+
+
+# rows written by older app code during a deploy, after the category migration ran
+register(Backfill("ledger-categories", "wallet_transactions", _categorize_ledger))
+register(Backfill("ledger-categories-archive", "wallet_transactions_archive", _categorize_ledger))
@@ -0,0 +1,200 @@
+# app/cache.py
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .metrics import metrics
+from .models import Product, Store
+
+
+# ---------------------------------------------------------
+# BACKENDS
+# get(key) -> value or None, set(key, value, ttl), delete_prefix(prefix)
+# ---------------------------------------------------------
+
+class NullBackend:
+    """Caching switched off: every lookup is a miss."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+
+class MemoryBackend:
+    """Per-process LRU with expiry. Other workers only see an invalidation
+    once their own copy expires, so keep the TTL short with this backend."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            if hit[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return hit[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+
+class SQLiteBackend:
+    """Pickled values in a local SQLite file shared by every worker on the
+    host, so an invalidation in one worker is seen by all of them at once."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # one connection per thread and per process (never reuse across fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + ttl),
+        )
+
+    def delete_prefix(self, prefix):
+        conn = self._connect()
+        conn.execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        conn.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+
+
+# ---------------------------------------------------------
+# CATALOG CACHE
+# ---------------------------------------------------------
+
+class CatalogCache:
+    """Read-through cache for marketplace catalog reads.
+
+    Values are plain dicts/lists (see row_dict), never ORM instances, so
+    they are safe to share between requests and to pickle. Any committed
+    Product/Store write through the ORM clears the whole catalog namespace.
+    """
+
+    namespace = "catalog:"
+
+    def __init__(self):
+        self.backend = NullBackend()
+        self.ttl = 300
+
+    def init_app(self, app):
+        app.config.setdefault("CATALOG_CACHE_BACKEND", "memory")
+        app.config.setdefault("CATALOG_CACHE_TTL", 300)
+        app.config.setdefault("CATALOG_CACHE_SIZE", 1024)
+        app.config.setdefault(
+            "CATALOG_CACHE_PATH", os.path.join(app.instance_path, "catalog_cache.sqlite")
+        )
+
+        kind = app.config["CATALOG_CACHE_BACKEND"]
+        if kind == "sqlite":
+            self.backend = SQLiteBackend(app.config["CATALOG_CACHE_PATH"])
+        elif kind == "memory":
+            self.backend = MemoryBackend(app.config["CATALOG_CACHE_SIZE"])
+        elif kind in (None, "null", "none"):
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f"unknown CATALOG_CACHE_BACKEND {kind!r}")
+        self.ttl = app.config["CATALOG_CACHE_TTL"]
+        app.extensions["catalog_cache"] = self
+
+    def get_or_set(self, key, loader, ttl=None):
+        """Cached value for key, else loader() (None results are not cached)."""
+        key = self.namespace + key
+        value = self.backend.get(key)
+        if value is not None:
+            metrics.count_cache("catalog", "hit")
+            return value
+
+        metrics.count_cache("catalog", "miss")
+        value = loader()
+        if value is not None:
+            self.backend.set(key, value, ttl or self.ttl)
+        return value
+
+    def invalidate(self):
+        self.backend.delete_prefix(self.namespace)
+        metrics.count_cache("catalog", "invalidate")
+
+
+catalog_cache = CatalogCache()
+
+
+def row_dict(obj, *extra):
+    """Column values of an ORM row, plus any named properties, as a plain dict
+    (templates read it the same way)."""
+    row = {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+    row.update((name, getattr(obj, name)) for name in extra)
+    return row
+
+
+# ---------------------------------------------------------
+# INVALIDATION
+# flag the session when a catalog row is flushed, clear once it commits
+# (clearing at flush time would let a concurrent reader re-cache old data)
+# ---------------------------------------------------------
+
+@event.listens_for(Session, "after_flush")
+def _flag_catalog_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Product, Store)):
+            session.info["catalog_dirty"] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("catalog_dirty", False):
+        catalog_cache.invalidate()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_on_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("catalog_dirty", None)
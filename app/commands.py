@@ -0,0 +1,206 @@
+# app/commands.py
+import math
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from .models import User
+
+vouchers_cli = AppGroup("vouchers", help="Voucher maintenance commands.")
+stats_cli = AppGroup("stats", help="Platform aggregate commands.")
+idempotency_cli = AppGroup("idempotency", help="Idempotency key maintenance.")
+utilities_cli = AppGroup("utilities", help="Utility purchase fulfilment.")
+assets_cli = AppGroup("assets", help="Static asset pipeline.")
+transactions_cli = AppGroup("transactions", help="Wallet ledger maintenance.")
+backfill_cli = AppGroup("backfill", help="Resumable batched data backfills.")
+images_cli = AppGroup("images", help="Product image processing.")
+
+
+@vouchers_cli.command("mint")
+@click.option("--creator", required=True, help="Creator user id or phone number.")
+@click.option("--amount", required=True, type=float, help="Value of each voucher.")
+@click.option("--count", required=True, type=click.IntRange(min=1), help="Number of vouchers to mint.")
+@click.option("--out", "out", type=click.File("w"), default="-", help="CSV output file (default: stdout).")
+def mint_command(creator, amount, count, out):
+    """Bulk-mint vouchers and write the codes as CSV."""
+    from .vouchers import mint_vouchers, iter_codes_csv
+
+    user = User.query.filter_by(phone=creator).first()
+    if user is None and creator.isdigit():
+        user = User.query.get(int(creator))
+    if user is None:
+        raise click.ClickException(f"No user matching {creator!r}")
+    if not (math.isfinite(amount) and amount > 0):
+        raise click.BadParameter("amount must be a positive number", param_hint="--amount")
+
+    codes = mint_vouchers(user.id, amount, count)
+    for chunk in iter_codes_csv(codes, amount):
+        out.write(chunk)
+    click.echo(f"Minted {len(codes)} vouchers for user {user.id}", err=True)
+
+
+@stats_cli.command("rebuild")
+def rebuild_command():
+    """Recompute platform_stats from the source tables."""
+    from .stats import get_stats, rebuild_stats
+
+    before = get_stats()
+    fresh = rebuild_stats()
+    for name, value in fresh.items():
+        drift = (value or 0) - (before.get(name) or 0)
+        note = f"  (drift {drift:+g})" if drift else ""
+        click.echo(f"{name:<20} {value or 0:g}{note}")
+
+
+@idempotency_cli.command("purge")
+def purge_command():
+    """Delete expired idempotency keys."""
+    from .idempotency import purge_expired
+
+    total = 0
+    while True:
+        removed = purge_expired()
+        total += removed
+        if not removed:
+            break
+    click.echo(f"Purged {total} expired idempotency keys")
+
+
+@utilities_cli.command("work")
+@click.option("--batch", default=10, type=click.IntRange(min=1), help="Purchases leased per claim.")
+@click.option("--lease", default=60, type=click.IntRange(min=1), help="Seconds before a stuck lease is retaken.")
+@click.option("--poll", default=1.0, type=float, help="Seconds to sleep when the queue is empty.")
+@click.option("--once", is_flag=True, help="Exit once nothing is due instead of polling.")
+def work_command(batch, lease, poll, once):
+    """Fulfil pending utility purchases through UTILITY_PROVIDER."""
+    from .fulfilment import run_worker
+
+    done = run_worker(batch=batch, lease_seconds=lease, poll_interval=poll, once=once)
+    click.echo(f"Processed {done} purchase(s)", err=True)
+
+
+@assets_cli.command("build")
+def build_assets_command():
+    """Fingerprint, precompress and resize app/static into ASSETS_BUILD_DIR."""
+    from .assets import build, brotli
+
+    app = current_app._get_current_object()
+    manifest = build(app)
+    for logical, entry in sorted(manifest.items()):
+        extra = entry.get("encodings") or sorted(
+            f"{fmt}@{w}" for fmt, sizes in entry.get("variants", {}).items() for w in sizes
+        )
+        click.echo(f"{logical} -> {entry['file']}  {' '.join(extra)}")
+    if brotli is None:
+        click.echo("brotli is not installed; only gzip variants were written", err=True)
+    click.echo(f"Wrote {len(manifest)} assets to {app.config['ASSETS_BUILD_DIR']}", err=True)
+
+
+@transactions_cli.command("archive")
+@click.option("--older-than-days", "days", type=click.IntRange(min=1), default=None,
+              help="Hot window to keep; at least TRANSACTIONS_HOT_DAYS (the default, 180).")
+@click.option("--batch", default=1000, type=click.IntRange(min=1), help="Rows moved per transaction.")
+@click.option("--sleep", default=0.1, type=float, help="Seconds to pause between batches.")
+@click.option("--max-batches", type=click.IntRange(min=1), default=None, help="Stop after this many batches.")
+def archive_command(days, batch, sleep, max_batches):
+    """Move wallet transactions older than the hot window to the archive table."""
+    import datetime
+    from .archive import hot_horizon, run_archive
+
+    hot_days = current_app.config.get("TRANSACTIONS_HOT_DAYS", 180)
+    if days is not None and days < hot_days:
+        # readers only look in the archive past hot_horizon(); anything newer
+        # moved there would silently drop out of history pages and exports
+        raise click.BadParameter(
+            f"must be at least TRANSACTIONS_HOT_DAYS ({hot_days})", param_hint="--older-than-days"
+        )
+    if days is None:
+        cutoff = hot_horizon()
+    else:
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+
+    def progress(moved, elapsed):
+        click.echo(f"{moved} rows archived ({moved / elapsed if elapsed else 0:.0f}/s)", err=True)
+
+    moved, elapsed = run_archive(cutoff, batch, sleep, max_batches, progress)
+    click.echo(f"Archived {moved} transactions created before {cutoff:%Y-%m-%d %H:%M} in {elapsed:.1f}s")
+
+
+@backfill_cli.command("list")
+def backfill_list_command():
+    """Show registered backfills and how far each has got."""
+    from . import db
+    from .backfill import BACKFILLS
+
+    with db.engine.connect() as conn:
+        for name, backfill in sorted(BACKFILLS.items()):
+            state = backfill.status(conn)
+            if state is None:
+                note = "not started"
+            elif state["finished_at"]:
+                note = f"done {state['finished_at']:%Y-%m-%d %H:%M}, {state['rows_done']} rows"
+            else:
+                note = f"at id {state['last_id']}/{state['max_id']}, {state['rows_done']} rows"
+            click.echo(f"{name:<30} {backfill.table.name:<30} {note}")
+
+
+@backfill_cli.command("run")
+@click.argument("name")
+@click.option("--batch-size", type=click.IntRange(min=1), default=None,
+              help="Rows per batch (default: BACKFILL_BATCH_SIZE, 1000).")
+@click.option("--sleep", type=float, default=None,
+              help="Seconds to pause between batches (default: BACKFILL_SLEEP, 0.05).")
+@click.option("--max-batches", type=click.IntRange(min=1), default=None, help="Stop after this many batches.")
+@click.option("--restart", is_flag=True, help="Discard the checkpoint and start from the first row.")
+def backfill_run_command(name, batch_size, sleep, max_batches, restart):
+    """Run or resume a registered backfill (a finished one picks up rows added since)."""
+    from . import db
+    from .backfill import BACKFILLS
+
+    backfill = BACKFILLS.get(name)
+    if backfill is None:
+        raise click.BadParameter(f"unknown backfill; one of: {', '.join(sorted(BACKFILLS))}", param_hint="NAME")
+
+    def progress(state, rate):
+        click.echo(
+            f"{state['rows_done']} rows, id {state['last_id']}/{state['max_id']}, {rate:.0f} rows/s",
+            err=True,
+        )
+
+    state = backfill.run(
+        db.engine,
+        batch_size=batch_size or current_app.config.get("BACKFILL_BATCH_SIZE", 1000),
+        sleep=current_app.config.get("BACKFILL_SLEEP", 0.05) if sleep is None else sleep,
+        restart=restart,
+        max_batches=max_batches,
+        progress=progress,
+    )
+    if state["finished_at"]:
+        click.echo(f"{name}: finished, {state['rows_done']} rows in {state['batches']} batches")
+    else:
+        click.echo(f"{name}: paused at id {state['last_id']}/{state['max_id']}; run again to resume")
+
+
+@images_cli.command("sweep")
+@click.option("--timeout", type=click.IntRange(min=1), default=None,
+              help="Seconds before processing counts as stuck (default: PRODUCT_IMAGE_TIMEOUT, 600).")
+def images_sweep_command(timeout):
+    """Mark product images stuck in processing as failed so they can be re-uploaded."""
+    from . import db
+    from .images import product_images
+
+    expired = product_images.expire_stale(timeout)
+    db.session.commit()
+    click.echo(f"Marked {expired} stuck product images as failed")
+
+
+def register_commands(app):
+    app.cli.add_command(vouchers_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(utilities_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(transactions_cli)
+    app.cli.add_command(backfill_cli)
+    app.cli.add_command(images_cli)
@@ -0,0 +1,179 @@
+# app/db_profiles.py
+import os
+import time
+import weakref
+
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from . import db
+from .metrics import metrics
+
+# pragmas applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",           # readers no longer block on the writer
+    "synchronous": "NORMAL",         # safe with WAL, far fewer fsyncs
+    "busy_timeout": 5000,            # wait for the write lock instead of erroring
+    "mmap_size": 268435456,          # 256MB of the file read through mmap
+    "temp_store": "MEMORY",
+}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_pool_wait(
+                getattr(self._dialect, "name", "unknown"), time.perf_counter() - start
+            )
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def select_profile(app):
+    """DB_PROFILE env/config wins; otherwise pick from the database URL."""
+    profile = app.config.get("DB_PROFILE") or os.environ.get("DB_PROFILE", "auto")
+    if profile != "auto":
+        return profile
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if uri.startswith("sqlite"):
+        return "sqlite"
+    if uri.startswith("postgresql"):
+        return "postgres"
+    return "none"
+
+
+def postgres_pool_size():
+    """(pool_size, max_overflow) per worker process.
+
+    One pooled connection per gunicorn thread plus up to half as many again
+    for bursts, all within the worker's share of DB_MAX_CONNECTIONS, so
+    workers * (pool_size + max_overflow) stays under the budget (every
+    worker still gets one connection if the budget is smaller than that).
+    """
+    workers = max(_env_int("WEB_CONCURRENCY", 1), 1)
+    threads = max(_env_int("GUNICORN_THREADS", 1), 1)
+    per_worker = max(1, _env_int("DB_MAX_CONNECTIONS", 20) // workers)
+    pool_size = min(threads, per_worker)
+    max_overflow = min(max(1, threads // 2), per_worker - pool_size)
+    return pool_size, max_overflow
+
+
+def engine_options(app, profile):
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if profile == "sqlite":
+        if ":memory:" in uri or uri in ("sqlite://", "sqlite:///"):
+            return {}
+        return {"poolclass": TimedQueuePool, "pool_size": 5, "max_overflow": 10}
+
+    if profile == "postgres":
+        pool_size, max_overflow = postgres_pool_size()
+        return {
+            "poolclass": TimedQueuePool,
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": _env_int("DB_POOL_TIMEOUT", 10),
+            "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+            "pool_pre_ping": True,
+        }
+    return {}
+
+
+def configure_engine(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS for the selected profile (before db.init_app)."""
+    profile = select_profile(app)
+    app.config["DB_PROFILE"] = profile
+    options = engine_options(app, profile)
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+    if profile == "postgres":
+        app.config.setdefault("DB_STATEMENT_TIMEOUT_MS", _env_int("DB_STATEMENT_TIMEOUT_MS", 5000))
+
+
+def _apply_sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _set_timeouts_sql(statement_ms, idle_ms):
+    # set_config(..., true) is SET LOCAL; both in one round trip
+    return (
+        f"SELECT set_config('statement_timeout', '{statement_ms}', true), "
+        f"set_config('idle_in_transaction_session_timeout', '{idle_ms}', true)"
+    )
+
+
+def _apply_request_timeouts(session, transaction, connection):
+    """SET LOCAL the web timeouts on each transaction a request opens.
+
+    Only inside a request: migrations, backfills, the archive job and the
+    fulfilment worker run without them, as do requests that called
+    exempt_from_timeouts().
+    """
+    if not has_request_context() or g.get("db_timeouts_exempt"):
+        return
+    timeout_ms = current_app.config.get("DB_STATEMENT_TIMEOUT_MS")
+    if not timeout_ms or connection.dialect.name != "postgresql":
+        return
+    connection.exec_driver_sql(_set_timeouts_sql(int(timeout_ms), int(timeout_ms) * 2))
+
+
+def exempt_from_timeouts():
+    """Lift the web timeouts for the rest of this request, e.g. for a
+    streaming export whose cursor sits idle while a slow client reads."""
+    g.db_timeouts_exempt = True
+    if db.session().in_transaction():
+        conn = db.session.connection()
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql(_set_timeouts_sql(0, 0))
+
+
+# engines whose pooled sockets a forked child must drop
+_fork_engines = weakref.WeakSet()
+
+
+def _dispose_in_child():
+    for engine in list(_fork_engines):
+        engine.dispose(close=False)
+
+
+# a preloaded parent must never hand its pooled sockets to forked workers;
+# close=False drops them in the child without touching the parent's.
+# Registered once per process, however many apps get created.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_in_child)
+
+
+def install_engine_hooks(app):
+    """Per-connection and per-transaction setup, fork safety (after db.init_app)."""
+    with app.app_context():
+        engine = db.engine
+
+    if app.config["DB_PROFILE"] == "sqlite":
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+
+    if not event.contains(Session, "after_begin", _apply_request_timeouts):
+        event.listen(Session, "after_begin", _apply_request_timeouts)
+
+    _fork_engines.add(engine)
+
+
+def dispose_engines(app):
+    """Drop pooled connections, e.g. from a gunicorn post_fork hook."""
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,168 @@
+# app/exports.py
+"""Streaming CSV/JSONL statements for merchants and wallet history.
+
+Rows are read with a server-side cursor (yield_per implies stream_results on
+Postgres; SQLite's cursor already fetches incrementally) and written out a
+chunk at a time, so memory stays flat however long the date range is and
+the first bytes leave before the query has finished.
+"""
+import csv
+import datetime
+import heapq
+import io
+import itertools
+import json
+
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import select
+
+from . import db
+from .archive import hot_horizon
+from .db_profiles import exempt_from_timeouts
+from .models import MerchantPayment, Voucher, WalletTransaction, WalletTransactionArchive
+
+# kind -> (model, owner column, exported columns)
+EXPORTS = {
+    "payments": (
+        MerchantPayment, "merchant_id",
+        ("code", "amount", "description", "status", "created_at", "paid_at"),
+    ),
+    "vouchers": (
+        Voucher, "creator_id",
+        ("code", "amount", "status", "created_at", "redeemed_at"),
+    ),
+    "transactions": (
+        WalletTransaction, "user_id",
+        ("id", "type", "category", "reference", "amount", "created_at"),
+    ),
+}
+# kinds whose older rows may have moved to a cold table (see app/archive.py)
+ARCHIVES = {"transactions": WalletTransactionArchive}
+
+EXPORT_CHUNK_ROWS = 1000
+
+
+class ExportError(ValueError):
+    """Bad export filters (unparseable date, inverted range, ...)."""
+
+
+def _date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ExportError(f"{name} must be a YYYY-MM-DD date") from None
+
+
+def parse_filters(args):
+    """(start, end, statuses) from query args; `to` is inclusive, so end is the day after."""
+    start = _date(args.get("from"), "from")
+    end = _date(args.get("to"), "to")
+    if end is not None:
+        end += datetime.timedelta(days=1)
+    if start and end and start >= end:
+        raise ExportError("from must not be after to")
+    statuses = [s.strip() for value in args.getlist("status") for s in value.split(",") if s.strip()]
+    return start, end, statuses
+
+
+def export_statement(kind, owner_id, start=None, end=None, statuses=(), chunk_rows=EXPORT_CHUNK_ROWS,
+                     model=None):
+    """SELECT for one owner's rows in (created_at, id) order, streamed chunk_rows at a time."""
+    default_model, owner, columns = EXPORTS[kind]
+    model = model or default_model
+    stmt = select(*(getattr(model, c) for c in columns)).where(getattr(model, owner) == owner_id)
+    if start is not None:
+        stmt = stmt.where(model.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(model.created_at < end)
+    if statuses:
+        if not hasattr(model, "status"):
+            raise ExportError(f"{kind} have no status to filter on")
+        stmt = stmt.where(model.status.in_(statuses))
+    return stmt.order_by(model.created_at, model.id).execution_options(yield_per=chunk_rows)
+
+
+def iter_chunks(stmt):
+    """Yield lists of rows straight off the cursor; closes it even if the client hangs up."""
+    result = db.session.execute(stmt)
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def merged_chunks(statements, chunk_rows):
+    """Interleave several (created_at, id)-ordered streams, re-chunked."""
+    streams = [itertools.chain.from_iterable(iter_chunks(stmt)) for stmt in statements]
+    rows = heapq.merge(*streams, key=lambda row: (row.created_at, row.id))
+    while True:
+        chunk = list(itertools.islice(rows, chunk_rows))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _cell(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(timespec="seconds")
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+def iter_csv(columns, chunks):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield buf.getvalue()
+    for rows in chunks:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(
+            [f"{c:.2f}" if isinstance(c, float) else _cell(c) for c in row] for row in rows
+        )
+        yield buf.getvalue()
+
+
+def iter_jsonl(columns, chunks):
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(columns, map(_cell, row))), separators=(",", ":")) + "\n"
+            for row in rows
+        )
+
+
+FORMATS = {
+    "csv": ("text/csv", iter_csv),
+    "jsonl": ("application/x-ndjson", iter_jsonl),
+}
+
+
+def export_response(kind, owner_id, fmt, args):
+    """Streaming download of one owner's rows; raises ExportError on bad filters."""
+    start, end, statuses = parse_filters(args)
+    # the cursor's transaction idles between chunks for as long as the client takes
+    exempt_from_timeouts()
+    chunk_rows = current_app.config.get("EXPORT_CHUNK_ROWS", EXPORT_CHUNK_ROWS)
+    stmt = export_statement(kind, owner_id, start, end, statuses, chunk_rows)
+    if kind in ARCHIVES and (start is None or start < hot_horizon()):
+        # the range reaches back past the hot window: merge in the cold rows too
+        cold = export_statement(kind, owner_id, start, end, statuses, chunk_rows, model=ARCHIVES[kind])
+        chunks = merged_chunks([cold, stmt], chunk_rows)
+    else:
+        chunks = iter_chunks(stmt)
+    mimetype, writer = FORMATS[fmt]
+    columns = EXPORTS[kind][2]
+    filename = f"{kind}-{datetime.datetime.utcnow():%Y%m%d%H%M%S}.{fmt}"
+    resp = Response(
+        stream_with_context(writer(columns, chunks)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+    # let proxies pass chunks through as they come instead of buffering the file
+    resp.headers["X-Accel-Buffering"] = "no"
+    resp.cache_control.no_store = True
+    return resp
@@ -0,0 +1,224 @@
+# app/fulfilment.py
+"""Utility purchase fulfilment, decoupled from the web request.
+
+Routes debit the wallet and write a pending UtilityPurchase in the same
+transaction (the outbox). `flask utilities work` runs one or more worker
+processes that lease batches of pending rows, call the provider, and mark
+each row completed -- or failed with the wallet refunded.
+"""
+import abc
+import datetime
+import logging
+import random
+import secrets
+import time
+
+from flask import current_app
+from sqlalchemy import and_, or_, select
+from werkzeug.utils import import_string
+
+from . import db
+from .models import UtilityPurchase
+from .wallet import credit, utility_category
+
+log = logging.getLogger("app.fulfilment")
+
+PENDING = "pending"
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class ProviderError(Exception):
+    """The vendor refused or could not be reached.
+
+    retryable=False means the purchase can never succeed (bad meter number,
+    unknown network, ...) and is refunded straight away.
+    """
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class UtilityProvider(abc.ABC):
+    """What a vendor integration implements."""
+
+    @abc.abstractmethod
+    def purchase(self, purchase):
+        """Fulfil one UtilityPurchase; return the vendor's reference or raise ProviderError.
+
+        `purchase` is detached from the session: read its fields, don't lazy-load.
+        """
+
+
+class StubProvider(UtilityProvider):
+    """Local stand-in: succeeds after UTILITY_STUB_LATENCY seconds, fails at
+    UTILITY_STUB_FAIL_RATE, and rejects details containing "invalid"."""
+
+    def __init__(self, latency=0.0, fail_rate=0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("UTILITY_STUB_LATENCY", 0.0), config.get("UTILITY_STUB_FAIL_RATE", 0.0))
+
+    def purchase(self, purchase):
+        if self.latency:
+            time.sleep(self.latency)
+        if "invalid" in (purchase.details or "").lower():
+            raise ProviderError("rejected by provider", retryable=False)
+        if random.random() < self.fail_rate:
+            raise ProviderError("provider timeout")
+        return f"STUB-{purchase.category}-{secrets.token_hex(4)}"
+
+
+def load_provider(app):
+    """Instantiate UTILITY_PROVIDER ("module:Class"), from_config() if it has one."""
+    cls = import_string(app.config.get("UTILITY_PROVIDER", "app.fulfilment:StubProvider"))
+    if hasattr(cls, "from_config"):
+        return cls.from_config(app.config)
+    return cls()
+
+
+def enqueue(user_id, category, amount, details):
+    """Record a paid-for purchase for the worker; the caller commits it with the debit."""
+    purchase = UtilityPurchase(
+        user_id=user_id,
+        category=category,
+        amount=amount,
+        details=details,
+        status=PENDING,
+        created_at=datetime.datetime.utcnow(),
+    )
+    db.session.add(purchase)
+    return purchase
+
+
+def claim_batch(size, lease_seconds, max_attempts):
+    """Lease up to size due purchases; returns [(id, attempt)].
+
+    Due = pending and past any retry backoff, or processing with an expired
+    lease (its worker died). Postgres skips rows another worker has locked;
+    SQLite runs the UPDATE under its single writer lock, which is just as safe.
+    A row whose lease keeps expiring is failed and refunded here instead of
+    being handed out again once it has used up max_attempts.
+    """
+    table = UtilityPurchase.__table__
+    now = datetime.datetime.utcnow()
+    due = select(table.c.id).where(
+        or_(
+            and_(table.c.status == PENDING,
+                 or_(table.c.lease_until.is_(None), table.c.lease_until <= now)),
+            and_(table.c.status == PROCESSING, table.c.lease_until <= now),
+        )
+    ).order_by(table.c.id).limit(size).with_for_update(skip_locked=True)
+
+    rows = db.session.execute(
+        table.update()
+        .where(table.c.id.in_(due.scalar_subquery()))
+        .values(
+            status=PROCESSING,
+            attempts=table.c.attempts + 1,
+            lease_until=now + datetime.timedelta(seconds=lease_seconds),
+        )
+        .returning(
+            table.c.id, table.c.attempts, table.c.user_id, table.c.amount, table.c.category,
+            table.c.created_at,
+        )
+    ).all()
+
+    claimed = []
+    for row in rows:
+        if row.attempts > max_attempts:
+            _fail(row, row.attempts, "lease expired too many times", now)
+            log.error("purchase %s gave up after %s attempt(s), refunded", row.id, max_attempts)
+        else:
+            claimed.append((row.id, row.attempts))
+    db.session.commit()
+    return sorted(claimed)
+
+
+def _finish(purchase_id, attempt, **values):
+    """Conditionally move a leased row on; False if the lease was lost meanwhile."""
+    table = UtilityPurchase.__table__
+    result = db.session.execute(
+        table.update()
+        .where(table.c.id == purchase_id, table.c.status == PROCESSING, table.c.attempts == attempt)
+        .values(**values)
+    )
+    return result.rowcount == 1
+
+
+def _fail(purchase, attempt, error, now):
+    """Mark a leased row failed and refund it, in the caller's transaction."""
+    if _finish(purchase.id, attempt, status=FAILED, error=str(error)[:255], lease_until=None, completed_at=now):
+        credit(
+            purchase.user_id, purchase.amount, f"Refund: {purchase.category} purchase failed",
+            utility_category(purchase.category), f"purchase:{purchase.id}",
+            # take the spend back off the day it was rolled up on
+            spend_day=purchase.created_at.date() if purchase.created_at else None,
+        )
+
+
+def process(provider, purchase_id, attempt, max_attempts):
+    """Fulfil one leased purchase and commit its outcome."""
+    purchase = db.session.get(UtilityPurchase, purchase_id, populate_existing=True)
+    # end the read transaction (and hand the connection back) before the
+    # provider call, which can take far longer than idle-in-transaction allows
+    db.session.close()
+    try:
+        reference = provider.purchase(purchase)
+    except ProviderError as e:
+        error, retryable = e, e.retryable
+    except Exception as e:
+        # a bug or an unexpected vendor response counts as a failed attempt
+        log.exception("purchase %s attempt %s raised", purchase_id, attempt)
+        error, retryable = e, True
+    else:
+        _finish(
+            purchase_id, attempt, status=COMPLETED, provider_ref=reference,
+            error=None, lease_until=None, completed_at=datetime.datetime.utcnow(),
+        )
+        db.session.commit()
+        return COMPLETED
+
+    now = datetime.datetime.utcnow()
+    if retryable and attempt < max_attempts:
+        backoff = min(2 ** attempt, 300)
+        _finish(
+            purchase_id, attempt, status=PENDING, error=str(error)[:255],
+            lease_until=now + datetime.timedelta(seconds=backoff),
+        )
+        db.session.commit()
+        log.warning("purchase %s attempt %s failed, retrying in %ss: %s", purchase_id, attempt, backoff, error)
+        return PENDING
+
+    # give the money back in the same transaction that marks the failure
+    _fail(purchase, attempt, error, now)
+    db.session.commit()
+    log.error("purchase %s failed after %s attempt(s), refunded: %s", purchase_id, attempt, error)
+    return FAILED
+
+
+def run_worker(batch=10, lease_seconds=60, poll_interval=1.0, once=False):
+    """Claim and fulfil purchases until stopped (or the queue drains, with once=True)."""
+    provider = load_provider(current_app)
+    max_attempts = current_app.config.get("UTILITY_MAX_ATTEMPTS", 5)
+    done = 0
+    while True:
+        claimed = claim_batch(batch, lease_seconds, max_attempts)
+        for purchase_id, attempt in claimed:
+            try:
+                process(provider, purchase_id, attempt, max_attempts)
+            except Exception:
+                # e.g. the database went away: leave it leased, it becomes due
+                # again when the lease runs out (claim_batch caps the retries)
+                db.session.rollback()
+                log.exception("purchase %s crashed the worker loop", purchase_id)
+            done += 1
+        if not claimed:
+            if once:
+                return done
+            time.sleep(poll_interval)
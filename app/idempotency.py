@@ -0,0 +1,203 @@
+# app/idempotency.py
+import datetime
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+
+from flask import Response, abort, current_app, flash, request, session
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+FORM_FIELD = "idempotency_key"
+MAX_KEY_LENGTH = 100
+
+# response headers worth replaying; cookies and caching headers are per-response
+REPLAY_HEADERS = ("Location", "Content-Type", "Content-Disposition")
+
+
+class Idempotency:
+    """Replay-safe money-moving POSTs.
+
+    The first request with a given (user, key) claims a row before doing
+    any work and stores its response afterwards. Retries get that stored
+    response back; a retry that arrives while the first is still running
+    polls the row until it finishes (or IDEMPOTENCY_WAIT runs out -> 409).
+
+    A pending claim only holds for IDEMPOTENCY_LEASE seconds (a few times
+    the worker timeout): if its worker was killed mid-request, the next
+    retry takes it over. Finished rows are kept for IDEMPOTENCY_TTL.
+    """
+
+    def __init__(self):
+        self._claims = 0
+
+    def init_app(self, app):
+        app.config.setdefault("IDEMPOTENCY_TTL", 86400)
+        app.config.setdefault("IDEMPOTENCY_LEASE", 120)
+        app.config.setdefault("IDEMPOTENCY_WAIT", 10.0)
+        app.config.setdefault("IDEMPOTENCY_POLL_INTERVAL", 0.05)
+        app.config.setdefault("IDEMPOTENCY_PURGE_EVERY", 500)
+        app.context_processor(lambda: {"idempotency_key": new_key})
+        app.extensions["idempotency"] = self
+
+    def protect(self, view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method != "POST":
+                return view(*args, **kwargs)
+            key = request.headers.get(HEADER) or request.form.get(FORM_FIELD)
+            if not key:
+                # keys are opt-in; older clients keep the old behaviour
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                abort(400)
+            return self._handle(key, view, args, kwargs)
+        return wrapped
+
+    # -- internals ---------------------------------------------------------
+
+    def _handle(self, key, view, args, kwargs):
+        fingerprint = request_fingerprint()
+        row = self._claim(key, fingerprint)
+        if row is not None:
+            return self._replay(row, fingerprint)
+
+        flashes_before = len(session.get("_flashes", []))
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            # nothing was committed by a view that blew up; free the key for a retry
+            db.session.rollback()
+            self._release(key)
+            raise
+
+        self._record(key, response, session.get("_flashes", [])[flashes_before:])
+        return response
+
+    def _claim(self, key, fingerprint):
+        """Insert the pending row; on conflict return the existing (finished) one."""
+        now = datetime.datetime.utcnow()
+        lease = datetime.timedelta(seconds=current_app.config["IDEMPOTENCY_LEASE"])
+        self._maybe_purge(now)
+
+        for _ in range(2):
+            db.session.add(IdempotencyKey(
+                user_id=current_user.id, key=key, endpoint=request.endpoint,
+                fingerprint=fingerprint, status="pending",
+                created_at=now, expires_at=now + lease,
+            ))
+            try:
+                # committed on its own so concurrent duplicates see the claim
+                db.session.commit()
+                return None
+            except IntegrityError:
+                db.session.rollback()
+
+            row = self._wait(key)
+            if row is None:
+                continue  # expired or released while we looked; claim again
+            return row
+        abort(409)
+
+    def _wait(self, key):
+        deadline = time.monotonic() + current_app.config["IDEMPOTENCY_WAIT"]
+        interval = current_app.config["IDEMPOTENCY_POLL_INTERVAL"]
+        while True:
+            row = self._load(key)
+            now = datetime.datetime.utcnow()
+            if row is None or row.expires_at <= now:
+                # gone, or a claim whose worker died: take it over
+                if row is not None:
+                    self._release(key, expired_before=now)
+                return None
+            if row.status == "done":
+                return row
+            if time.monotonic() >= deadline:
+                abort(409)
+            db.session.rollback()  # end the read transaction so the next poll sees new commits
+            time.sleep(interval)
+
+    def _load(self, key):
+        return db.session.execute(
+            db.select(IdempotencyKey).filter_by(user_id=current_user.id, key=key)
+            .execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+
+    def _replay(self, row, fingerprint):
+        if row.fingerprint != fingerprint or row.endpoint != request.endpoint:
+            # same key reused for a different request is a client bug
+            abort(422)
+        for category, message in json.loads(row.flashes or "[]"):
+            flash(message, category)
+        response = Response(row.response_body or b"", status=row.response_status)
+        for name, value in json.loads(row.response_headers or "{}").items():
+            response.headers[name] = value
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    def _record(self, key, response, flashes):
+        body = b"" if response.is_streamed else response.get_data()
+        headers = {h: response.headers[h] for h in REPLAY_HEADERS if h in response.headers}
+        ttl = datetime.timedelta(seconds=current_app.config["IDEMPOTENCY_TTL"])
+        db.session.rollback()  # anything the view left uncommitted is not part of the outcome
+        db.session.execute(
+            db.update(IdempotencyKey)
+            .filter_by(user_id=current_user.id, key=key)
+            .values(
+                status="done",
+                expires_at=datetime.datetime.utcnow() + ttl,
+                response_status=response.status_code,
+                response_headers=json.dumps(headers),
+                response_body=body,
+                flashes=json.dumps([list(f) for f in flashes]),
+            )
+        )
+        db.session.commit()
+
+    def _release(self, key, expired_before=None):
+        stmt = db.delete(IdempotencyKey).filter_by(user_id=current_user.id, key=key)
+        if expired_before is not None:
+            # two retries may both find the dead claim; don't delete the winner's new one
+            stmt = stmt.where(IdempotencyKey.expires_at <= expired_before)
+        db.session.execute(stmt)
+        db.session.commit()
+
+    def _maybe_purge(self, now):
+        self._claims += 1
+        every = current_app.config["IDEMPOTENCY_PURGE_EVERY"]
+        if every and self._claims % every == 0:
+            purge_expired(now)
+
+
+def new_key():
+    """Fresh key for a form's hidden idempotency_key field."""
+    return uuid.uuid4().hex
+
+
+def request_fingerprint():
+    """Hash of what the request asks for, so a reused key can't change it."""
+    form = sorted((k, v) for k, v in request.form.items(multi=True) if k != FORM_FIELD)
+    raw = json.dumps([request.path, form, request.get_data(as_text=True) if not form else ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def purge_expired(now=None, batch=1000):
+    """Delete up to batch expired keys; returns how many went."""
+    now = now or datetime.datetime.utcnow()
+    ids = db.session.execute(
+        db.select(IdempotencyKey.id).where(IdempotencyKey.expires_at <= now).limit(batch)
+    ).scalars().all()
+    if ids:
+        db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+        db.session.commit()
+    return len(ids)
+
+
+idempotency = Idempotency()
+idempotent = idempotency.protect
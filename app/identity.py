@@ -0,0 +1,99 @@
+# app/identity.py
+import threading
+import time
+
+from flask_login import UserMixin
+from sqlalchemy import event
+
+from . import db
+from .models import User
+
+
+class UserSnapshot(UserMixin):
+    """What most pages need to know about the logged-in user.
+
+    Anything beyond id/phone/is_admin (wallet_balance, relationships, ...)
+    transparently loads the live User row on first access, so balance-
+    sensitive code always sees fresh data.
+    """
+
+    def __init__(self, id, phone, is_admin):
+        self.id = id
+        self.phone = phone
+        self.is_admin = is_admin
+        self._live = None
+
+    def get_id(self):
+        return str(self.id)
+
+    @property
+    def live(self):
+        if self._live is None:
+            self._live = db.session.get(User, self.id)
+        return self._live
+
+    def __getattr__(self, name):
+        # only called for attributes not set above
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.live, name)
+
+
+class IdentityCache:
+    """Per-process TTL cache of (phone, is_admin) keyed by user id."""
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("USER_CACHE_TTL", 60)
+        app.config.setdefault("USER_CACHE_SIZE", 10000)
+        self.ttl = app.config["USER_CACHE_TTL"]
+        self.max_entries = app.config["USER_CACHE_SIZE"]
+
+    def load(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(user_id)
+        if hit is not None and hit[0] > now:
+            return UserSnapshot(user_id, *hit[1])
+
+        row = db.session.query(User.phone, User.is_admin).filter(User.id == user_id).first()
+        if row is None:
+            self.invalidate(user_id)
+            return None
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict(now)
+            self._entries[user_id] = (now + self.ttl, (row.phone, bool(row.is_admin)))
+        return UserSnapshot(user_id, row.phone, bool(row.is_admin))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self, now):
+        expired = [k for k, (exp, _) in self._entries.items() if exp <= now]
+        for k in expired:
+            del self._entries[k]
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+
+
+identity_cache = IdentityCache()
+
+
+# ORM writes to a user (admin flag, phone, deletes) drop the cached identity.
+# Balance moves go through Core UPDATEs in app/wallet.py and aren't cached here.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    identity_cache.invalidate(target.id)
@@ -0,0 +1,175 @@
+# app/images.py
+import datetime
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from PIL import Image, ImageOps
+from sqlalchemy import or_
+
+from . import db
+
+log = logging.getLogger("app.images")
+
+# variant name -> bounding box width; heights keep the aspect ratio
+VARIANTS = {"thumb": 160, "card": 480, "detail": 1200}
+FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}),
+           "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True})}
+MAX_PIXELS = 40_000_000  # refuse decompression bombs before decoding
+
+
+class InvalidImage(ValueError):
+    """The upload is not an image Pillow can read (or is absurdly large)."""
+
+
+def probe(data):
+    """Cheap header-only check run in the request; returns (format, width, height)."""
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            width, height = im.size
+            fmt = im.format
+    except Exception:
+        raise InvalidImage("not a supported image file") from None
+    if width * height > MAX_PIXELS:
+        raise InvalidImage(f"{width}x{height} is too large")
+    return fmt, width, height
+
+
+def render_variants(data):
+    """Decode once and encode every variant: {name: {fmt: (bytes, w, h)}}.
+
+    Runs in a pool process, so it takes and returns only plain bytes/tuples.
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    with Image.open(io.BytesIO(data)) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode in ("RGBA", "LA", "P"):
+            # JPEG has no alpha: flatten onto white once, reuse for every variant
+            im = im.convert("RGBA")
+            flat = Image.new("RGB", im.size, (255, 255, 255))
+            flat.paste(im, mask=im.getchannel("A"))
+            im = flat
+        elif im.mode != "RGB":
+            im = im.convert("RGB")
+
+        out = {}
+        # largest first, each one shrunk from the previous: far fewer pixels to resample
+        source = im
+        for name, width in sorted(VARIANTS.items(), key=lambda kv: -kv[1]):
+            variant = source.copy()
+            variant.thumbnail((width, width * 4), Image.LANCZOS)  # never upscales
+            source = variant
+            out[name] = {}
+            for fmt, (pil_format, options) in FORMATS.items():
+                buf = io.BytesIO()
+                variant.save(buf, pil_format, **options)
+                out[name][fmt] = (buf.getvalue(), variant.width, variant.height)
+        return out
+
+
+class ProductImages:
+    """Off-request product image processing with content-addressed storage.
+
+    The upload is probed in the request, then resized on a process pool;
+    a callback writes each variant as <sha256>.<ext> under PRODUCT_IMAGE_DIR
+    and stores the name map on Product.image_variants. Identical bytes map
+    to the same file, so re-uploads and shared images cost nothing.
+
+    If the pool dies before the callback runs (a restart, an OOM kill), the
+    product would stay "processing"; expire_stale() fails anything that has
+    been processing for longer than PRODUCT_IMAGE_TIMEOUT seconds.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.max_workers = 2
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("PRODUCT_IMAGE_DIR", os.path.join(app.instance_path, "product_images"))
+        app.config.setdefault("PRODUCT_IMAGE_WORKERS", 2)
+        app.config.setdefault("PRODUCT_IMAGE_MAX_BYTES", 10 * 1024 * 1024)
+        app.config.setdefault("PRODUCT_IMAGE_TIMEOUT", 600)
+        self.directory = app.config["PRODUCT_IMAGE_DIR"]
+        self.max_workers = app.config["PRODUCT_IMAGE_WORKERS"]
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions["product_images"] = self
+
+    def _pool(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # spawn, not fork: forking a threaded gunicorn worker can copy held locks
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def start(self, product):
+        """Mark product as processing; the caller commits, then submit()s."""
+        product.image_status = "processing"
+        product.image_started_at = datetime.datetime.utcnow()
+
+    def expire_stale(self, timeout=None):
+        """Fail products stuck in "processing"; returns how many. Not committed."""
+        from .models import Product
+
+        timeout = timeout or current_app.config.get("PRODUCT_IMAGE_TIMEOUT", 600)
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=timeout)
+        return Product.query.filter(
+            Product.image_status == "processing",
+            or_(Product.image_started_at.is_(None), Product.image_started_at < cutoff),
+        ).update({"image_status": "failed"}, synchronize_session=False)
+
+    def submit(self, app, product_id, data):
+        """Queue data for product_id (already probed); returns the Future."""
+        future = self._pool().submit(render_variants, data)
+        future.add_done_callback(lambda f: self._finish(app, product_id, f))
+        return future
+
+    def _finish(self, app, product_id, future):
+        from .models import Product
+
+        with app.app_context():
+            product = db.session.get(Product, product_id)
+            if product is None:
+                return
+            try:
+                variants = future.result()
+            except Exception:
+                log.exception("image processing failed for product %s", product_id)
+                product.image_status = "failed"
+            else:
+                product.image_variants = json.dumps(self.store(variants), sort_keys=True)
+                product.image_status = "ready"
+            db.session.commit()
+
+    def store(self, variants):
+        """Write rendered variants content-addressed; returns {name: {fmt: file, "w", "h"}}."""
+        stored = {}
+        for name, formats in variants.items():
+            entry = {}
+            for fmt, (blob, width, height) in formats.items():
+                filename = f"{hashlib.sha256(blob).hexdigest()[:32]}.{'jpg' if fmt == 'jpeg' else fmt}"
+                path = os.path.join(self.directory, filename)
+                if not os.path.exists(path):
+                    fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                    with os.fdopen(fd, "wb") as fh:
+                        fh.write(blob)
+                    os.replace(tmp, path)
+                entry[fmt] = filename
+                entry["w"], entry["h"] = width, height
+            stored[name] = entry
+        return stored
+
+
+product_images = ProductImages()
@@ -1,66 +1,86 @@
 
-from flask import Blueprint, render_template, request
+from flask import Blueprint, render_template, request, abort
 from flask_login import login_required, current_user
 from .models import Store, Product
+from .pagination import encode_cursor, decode_cursor
+from .search import search_products, PRODUCT_CATEGORIES
+from .cache import catalog_cache, row_dict
 
 market = Blueprint("market", __name__, url_prefix="/market")
 
+STORE_PAGE_SIZE = 20
+# computed Product properties the cached product dicts carry for templates
+PRODUCT_IMAGE_FIELDS = ("image_url", "image_thumb_url", "image_srcset", "image_srcset_webp")
+
 @market.route("/")
 @login_required
 def marketplace_home():
-    stores = Store.query.limit(10).all()
-    categories = [
-        "Fashion", "Electronics", "Home", "Beauty",
-        "Kids", "Fitness", "Groceries", "Tech Accessories"
-    ]
+    stores = catalog_cache.get_or_set(
+        "home:stores", lambda: [row_dict(s) for s in Store.query.limit(10)]
+    )
     return render_template(
         "market/home.html",
         stores=stores,
-        categories=categories
+        categories=PRODUCT_CATEGORIES
     )
 
-@market.route("/store/<int:store_id>")
+@market.route("/search")
 @login_required
-def view_store(store_id):
-    store = Store.query.get_or_404(store_id)
-    products = Product.query.filter_by(store_id=store_id).limit(20).all()
-    return render_template("market/store.html", store=store, products=products)
-
-@market.route("/product/<int:product_id>")
-@login_required
-def view_product(product_id):
-    product = Product.query.get_or_404(product_id)
-
-from flask import Blueprint, render_template, request
-from flask_login import login_required, current_user
-from .models import Store, Product
+def search():
+    q = request.args.get("q", "").strip()
+    category = request.args.get("category") or None
+    after = decode_cursor(request.args.get("after"), float, int)
 
-market = Blueprint("market", __name__, url_prefix="/market")
-
-@market.route("/")
-@login_required
-def marketplace_home():
-    stores = Store.query.limit(10).all()
-    categories = [
-        "Fashion", "Electronics", "Home", "Beauty",
-        "Kids", "Fitness", "Groceries", "Tech Accessories"
-    ]
+    products, next_after = search_products(q, category=category, after=after)
     return render_template(
-        "market/home.html",
-        stores=stores,
-        categories=categories
+        "market/search.html",
+        q=q,
+        category=category,
+        categories=PRODUCT_CATEGORIES,
+        products=products,
+        next_cursor=encode_cursor(*next_after) if next_after else None
     )
 
 @market.route("/store/<int:store_id>")
 @login_required
 def view_store(store_id):
-    store = Store.query.get_or_404(store_id)
-    products = Product.query.filter_by(store_id=store_id).limit(20).all()
-    return render_template("market/store.html", store=store, products=products)
+    after = decode_cursor(request.args.get("after"), int)
+    page = catalog_cache.get_or_set(
+        f"store:{store_id}:{after[0] if after else 0}", lambda: _store_page(store_id, after)
+    )
+    if page is None:
+        abort(404)
+    store, products, next_cursor = page
+    return render_template("market/store.html", store=store, products=products, next_cursor=next_cursor)
+
+def _store_page(store_id, after):
+    store = Store.query.get(store_id)
+    if store is None:
+        return None
+    # keyset pages over ix_products_store_id_id
+    query = Product.query.filter_by(store_id=store_id)
+    if after:
+        query = query.filter(Product.id > after[0])
+    products = query.order_by(Product.id).limit(STORE_PAGE_SIZE + 1).all()
+
+    next_cursor = None
+    if len(products) > STORE_PAGE_SIZE:
+        products = products[:STORE_PAGE_SIZE]
+        next_cursor = encode_cursor(products[-1].id)
+    return row_dict(store), [row_dict(p, *PRODUCT_IMAGE_FIELDS) for p in products], next_cursor
 
 @market.route("/product/<int:product_id>")
 @login_required
 def view_product(product_id):
-    product = Product.query.get_or_404(product_id)
+    product = product_details(product_id)
+    if product is None:
+        abort(404)
+
+    return render_template("market/product.html", product=product)
 
-    return render_template("market/product.html", product=product)
\ No newline at end of file
+def product_details(product_id):
+    """A product's columns as a dict, through the catalog cache (None if missing)."""
+    def load():
+        product = Product.query.get(product_id)
+        return row_dict(product, *PRODUCT_IMAGE_FIELDS) if product is not None else None
+    return catalog_cache.get_or_set(f"product:{product_id}", load)
@@ -0,0 +1,261 @@
+# app/metrics.py
+import logging
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_query_log = logging.getLogger("app.slow_query")
+
+POOL_WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+KDF_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+_WS_RE = re.compile(r"\s+")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_RE = re.compile(r"%\(\w+\)s|(?<!:):\w+|\$\d+|\?")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+
+
+def normalize_sql(statement):
+    """Collapse literals/placeholders so equivalent queries group together."""
+    sql = _WS_RE.sub(" ", statement).strip()
+    sql = _STRING_RE.sub("?", sql)
+    sql = _PARAM_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return sql
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Metrics:
+    """Per-process request, SQL and template metrics, keyed by endpoint.
+
+    Each gunicorn worker keeps its own numbers; Prometheus sees whichever
+    worker answers the scrape, so compare rates rather than absolute totals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.slow_threshold = 0.25
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}          # (endpoint, method, status) -> count
+            self.latency = {}           # endpoint -> Histogram (seconds)
+            self.query_counts = {}      # endpoint -> Histogram (queries/request)
+            self.query_seconds = {}     # endpoint -> total seconds in SQL
+            self.template_seconds = {}  # template -> Histogram (seconds)
+            self.slow_queries = {}      # endpoint -> count
+            self.pool_wait = {}         # dialect -> Histogram (seconds)
+            self.kdf_seconds = {}       # "hash" / "verify" -> Histogram (seconds)
+            self.auth_rejections = {}   # reason -> count
+            self.cache_events = {}      # (cache, result) -> count
+
+    def init_app(self, app):
+        app.config.setdefault("SLOW_QUERY_SECONDS", 0.25)
+        app.config.setdefault("METRICS_TOKEN", None)
+        self.slow_threshold = app.config["SLOW_QUERY_SECONDS"]
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.extensions["metrics"] = self
+
+    # -- request lifecycle -------------------------------------------------
+
+    def _before_request(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_queries = 0
+        g._metrics_query_time = 0.0
+
+    def _after_request(self, response):
+        start = g.pop("_metrics_start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or "<unmatched>"
+        queries = g.pop("_metrics_queries", 0)
+        query_time = g.pop("_metrics_query_time", 0.0)
+
+        with self._lock:
+            key = (endpoint, request.method, response.status_code)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault(endpoint, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.query_counts.setdefault(endpoint, Histogram(QUERY_COUNT_BUCKETS)).observe(queries)
+            self.query_seconds[endpoint] = self.query_seconds.get(endpoint, 0.0) + query_time
+        return response
+
+    # -- templates ---------------------------------------------------------
+
+    def _before_render(self, sender, template, context, **extra):
+        g.setdefault("_metrics_render_stack", []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        stack = g.get("_metrics_render_stack")
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        name = template.name or "<string>"
+        with self._lock:
+            self.template_seconds.setdefault(name, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+
+    # -- SQL ---------------------------------------------------------------
+
+    # the start time lives on the statement's execution context, so a query
+    # that raises (after_cursor_execute never fires) leaves nothing behind
+    def _query_started(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_query_start = time.perf_counter()
+
+    def _query_finished(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_query_start", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+
+        endpoint = "-"
+        if has_request_context():
+            endpoint = request.endpoint or "<unmatched>"
+            if "_metrics_queries" in g:
+                g._metrics_queries += 1
+                g._metrics_query_time += elapsed
+
+        if elapsed >= self.slow_threshold:
+            with self._lock:
+                self.slow_queries[endpoint] = self.slow_queries.get(endpoint, 0) + 1
+            slow_query_log.warning(
+                "slow query %.3fs endpoint=%s sql=%s",
+                elapsed, endpoint, normalize_sql(statement)
+            )
+
+    def observe_pool_wait(self, dialect, seconds):
+        with self._lock:
+            self.pool_wait.setdefault(dialect, Histogram(POOL_WAIT_BUCKETS)).observe(seconds)
+
+    def observe_kdf(self, op, seconds):
+        with self._lock:
+            self.kdf_seconds.setdefault(op, Histogram(KDF_BUCKETS)).observe(seconds)
+
+    def count_auth_rejection(self, reason):
+        with self._lock:
+            self.auth_rejections[reason] = self.auth_rejections.get(reason, 0) + 1
+
+    def count_cache(self, cache, result):
+        with self._lock:
+            key = (cache, result)
+            self.cache_events[key] = self.cache_events.get(key, 0) + 1
+
+    # -- exposition --------------------------------------------------------
+
+    def render_prometheus(self):
+        """Everything collected so far in Prometheus text format 0.0.4."""
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP senti_http_requests_total Requests by endpoint, method and status.",
+                "# TYPE senti_http_requests_total counter",
+            ]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f"senti_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}"
+                )
+
+            _histogram_lines(
+                lines, "senti_http_request_duration_seconds",
+                "Request latency by endpoint.", "endpoint", self.latency
+            )
+            _histogram_lines(
+                lines, "senti_db_queries_per_request",
+                "SQL statements issued per request by endpoint.", "endpoint", self.query_counts
+            )
+
+            lines += [
+                "# HELP senti_db_query_seconds_total Time spent in SQL by endpoint.",
+                "# TYPE senti_db_query_seconds_total counter",
+            ]
+            for endpoint, seconds in sorted(self.query_seconds.items()):
+                lines.append(f"senti_db_query_seconds_total{_labels(endpoint=endpoint)} {seconds:.6f}")
+
+            lines += [
+                "# HELP senti_db_slow_queries_total Queries slower than SLOW_QUERY_SECONDS.",
+                "# TYPE senti_db_slow_queries_total counter",
+            ]
+            for endpoint, count in sorted(self.slow_queries.items()):
+                lines.append(f"senti_db_slow_queries_total{_labels(endpoint=endpoint)} {count}")
+
+            _histogram_lines(
+                lines, "senti_db_pool_wait_seconds",
+                "Time spent waiting to check a connection out of the pool.", "dialect", self.pool_wait
+            )
+            _histogram_lines(
+                lines, "senti_password_kdf_seconds",
+                "Password hash/verify time on the KDF pool.", "op", self.kdf_seconds
+            )
+            lines += [
+                "# HELP senti_auth_rejections_total Login/register attempts refused before hashing.",
+                "# TYPE senti_auth_rejections_total counter",
+            ]
+            for reason, count in sorted(self.auth_rejections.items()):
+                lines.append(f"senti_auth_rejections_total{_labels(reason=reason)} {count}")
+
+            lines += [
+                "# HELP senti_cache_requests_total Cache lookups by cache and result (hit/miss/invalidate).",
+                "# TYPE senti_cache_requests_total counter",
+            ]
+            for (cache, result), count in sorted(self.cache_events.items()):
+                lines.append(f"senti_cache_requests_total{_labels(cache=cache, result=result)} {count}")
+
+            _histogram_lines(
+                lines, "senti_template_render_seconds",
+                "Template render time by template.", "template", self.template_seconds
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(lines, name, help_text, label, histograms):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, hist in sorted(histograms.items()):
+        for bound, count in zip(hist.buckets, hist.counts):
+            lines.append(f"{name}_bucket{_labels(**{label: key, 'le': bound})} {count}")
+        lines.append(f"{name}_bucket{_labels(**{label: key, 'le': '+Inf'})} {hist.total}")
+        lines.append(f"{name}_sum{_labels(**{label: key})} {hist.sum:.6f}")
+        lines.append(f"{name}_count{_labels(**{label: key})} {hist.total}")
+
+
+metrics = Metrics()
+
+# every engine reports into the same registry
+event.listen(Engine, "before_cursor_execute", metrics._query_started)
+event.listen(Engine, "after_cursor_execute", metrics._query_finished)
@@ -1,4 +1,6 @@
+import json
 from datetime import datetime
+from flask import url_for
 from flask_login import UserMixin
 from . import db
 
@@ -21,6 +23,12 @@ class User(UserMixin, db.Model):
         return str(self.id)
 
 
+# admin directory pages walk users newest first with keyset cursors
+# (phone-prefix search also has a Postgres-only text_pattern_ops index,
+# ix_users_phone_pattern, created by its migration)
+db.Index("ix_users_created", User.created_at.desc(), User.id)
+
+
 # ====
 # WALLET TRANSACTION LOG
 # ====
@@ -32,10 +40,58 @@ class WalletTransaction(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
 
     type = db.Column(db.String(100))
+    # structured form of `type` (see app/wallet.py for the values)
+    category = db.Column(db.String(30))
+    reference = db.Column(db.String(100))
     amount = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+# history pages walk (user_id, created_at DESC, id) with keyset cursors
+db.Index(
+    "ix_wallet_transactions_user_created",
+    WalletTransaction.user_id,
+    WalletTransaction.created_at.desc(),
+    WalletTransaction.id,
+)
+
+
+class WalletTransactionArchive(db.Model):
+    """Cold copy of wallet_transactions rows older than the hot horizon
+    (moved by `flask transactions archive`; ids are kept)."""
+    __tablename__ = "wallet_transactions_archive"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    type = db.Column(db.String(100))
+    category = db.Column(db.String(30))
+    reference = db.Column(db.String(100))
+    amount = db.Column(db.Float)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+db.Index(
+    "ix_wallet_transactions_archive_user_created",
+    WalletTransactionArchive.user_id,
+    WalletTransactionArchive.created_at.desc(),
+    WalletTransactionArchive.id,
+)
+
+
+
+class DailySpend(db.Model):
+    """Money out per (user, day, category), kept up to date by app/wallet.py
+    so spend summaries are one primary-key range read."""
+    __tablename__ = "daily_spend"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(30), primary_key=True)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    tx_count = db.Column(db.Integer, nullable=False, default=0)
+
+
 # ====
 # MERCHANT PAYMENT
 # ====
@@ -55,6 +111,10 @@ class MerchantPayment(db.Model):
     paid_at = db.Column(db.DateTime)
 
 
+# statement exports walk one merchant's rows in (created_at, id) order
+db.Index("ix_merchant_payments_merchant_created", MerchantPayment.merchant_id, MerchantPayment.created_at, MerchantPayment.id)
+
+
 # ====
 # VOUCHERS
 # ====
@@ -73,6 +133,9 @@ class Voucher(db.Model):
     redeemed_at = db.Column(db.DateTime)
 
 
+db.Index("ix_vouchers_creator_created", Voucher.creator_id, Voucher.created_at, Voucher.id)
+
+
 # ====
 # STORE + MARKETPLACE MODELS
 # ====
@@ -94,11 +157,63 @@ class Product(db.Model):
 
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
+    category = db.Column(db.String(50))
     price = db.Column(db.Float, nullable=False)
     image = db.Column(db.String(255))
+    # processed upload (see app/images.py): {"thumb"|"card"|"detail": {"webp", "jpeg", "w", "h"}}
+    image_variants = db.Column(db.Text)
+    image_status = db.Column(db.String(20))  # processing / ready / failed
+    image_started_at = db.Column(db.DateTime)  # when the current processing began
     in_stock = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    def _variants(self):
+        return json.loads(self.image_variants) if self.image_variants else {}
+
+    def _image_file_url(self, variant, fmt):
+        entry = self._variants().get(variant)
+        if not entry:
+            return self._legacy_image_url()
+        return url_for("main.product_image", filename=entry[fmt])
+
+    def _legacy_image_url(self):
+        # products from before uploads (or still processing) only have the
+        # `image` field: a URL, or a file under static/images
+        if not self.image:
+            return None
+        if "://" in self.image or self.image.startswith("/"):
+            return self.image
+        return url_for("static", filename=f"images/{self.image}")
+
+    def _srcset(self, fmt):
+        variants = self._variants()
+        return ", ".join(
+            f"{url_for('main.product_image', filename=v[fmt])} {v['w']}w"
+            for v in sorted(variants.values(), key=lambda v: v["w"])
+        ) or None
+
+    @property
+    def image_url(self):
+        return self._image_file_url("card", "jpeg")
+
+    @property
+    def image_thumb_url(self):
+        return self._image_file_url("thumb", "jpeg")
+
+    @property
+    def image_srcset(self):
+        return self._srcset("jpeg")
+
+    @property
+    def image_srcset_webp(self):
+        return self._srcset("webp")
+
+
+# keyset pages for category browse and store listings;
+# full-text indexes are dialect-specific and live in the migration (see app/search.py)
+db.Index("ix_products_category_id", Product.category, Product.id)
+db.Index("ix_products_store_id_id", Product.store_id, Product.id)
+
 
 class CartItem(db.Model):
     __tablename__ = "cart_items"
@@ -143,6 +258,73 @@ class UtilityPurchase(db.Model):
     category = db.Column(db.String(50))
     amount = db.Column(db.Float)
     details = db.Column(db.String(200))
-    status = db.Column(db.String(20), default="completed")
+    # pending -> processing (leased by a worker) -> completed | failed (refunded)
+    status = db.Column(db.String(20), default="pending")
+
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    lease_until = db.Column(db.DateTime)  # lease expiry, or retry-not-before while pending
+    provider_ref = db.Column(db.String(100))
+    error = db.Column(db.String(255))
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+
+# the fulfilment worker claims (status, lease_until) ordered by id
+db.Index("ix_utility_purchases_status_lease", UtilityPurchase.status, UtilityPurchase.lease_until)
+
+# ====
+# PLATFORM STATS (INCREMENTAL AGGREGATES)
+# ====
+
+class PlatformStat(db.Model):
+    __tablename__ = "platform_stats"
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+
+
+# ====
+# IDEMPOTENCY KEYS (REPLAY-SAFE MONEY POSTS)
+# ====
+
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+
+    endpoint = db.Column(db.String(100), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+
+    response_status = db.Column(db.Integer)
+    response_headers = db.Column(db.Text)
+    response_body = db.Column(db.LargeBinary)
+    flashes = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# ====
+# BACKFILL CHECKPOINTS (RESUMABLE DATA MIGRATIONS)
+# ====
+
+class BackfillProgress(db.Model):
+    """How far a named backfill (app/backfill.py) has got."""
+    __tablename__ = "backfill_progress"
+
+    name = db.Column(db.String(100), primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)
+    max_id = db.Column(db.BigInteger, nullable=False, default=0)
+    rows_done = db.Column(db.BigInteger, nullable=False, default=0)
+    batches = db.Column(db.Integer, nullable=False, default=0)
 
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
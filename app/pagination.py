@@ -0,0 +1,46 @@
+# app/pagination.py
+import base64
+import datetime
+import json
+
+
+def encode_cursor(*values):
+    """Pack sort-key values into an opaque, URL-safe cursor string."""
+    packed = [
+        {"dt": v.isoformat()} if isinstance(v, datetime.datetime) else v
+        for v in values
+    ]
+    raw = json.dumps(packed, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _matches(value, kind):
+    if isinstance(value, bool):
+        return False
+    if kind is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, kind)
+
+
+def decode_cursor(token, *types):
+    """Unpack a cursor made by encode_cursor; None if missing or malformed.
+
+    types gives the expected type of each value (e.g. datetime.datetime, int),
+    so a tampered token never reaches the WHERE clause with the wrong shape.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        packed = json.loads(raw)
+        values = tuple(
+            datetime.datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v
+            for v in packed
+        )
+    except (ValueError, TypeError, KeyError):
+        return None
+    if len(values) != len(types):
+        return None
+    if not all(_matches(v, kind) for v, kind in zip(values, types)):
+        return None
+    return values
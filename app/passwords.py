@@ -0,0 +1,189 @@
+# app/passwords.py
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+)
+
+from .metrics import metrics
+
+
+class HasherBusy(Exception):
+    """The KDF pool is saturated; the caller should answer 429."""
+
+
+class Throttled(Exception):
+    """Too many recent attempts for this phone or client address."""
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+def normalize_method(method):
+    """Spell out Werkzeug's defaults so stored hashes compare exactly."""
+    name, *args = method.split(":")
+    if name == "scrypt":
+        n, r, p = args or (2 ** 15, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    if name == "pbkdf2":
+        hash_name = args[0] if args else "sha256"
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    return method
+
+
+class AttemptLimiter:
+    """Fixed-window attempt counters, per process (like the identity cache)."""
+
+    def __init__(self, limit, window, max_keys=50000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def retry_after(self, key):
+        """Seconds until key may try again, or 0 if it is under the limit."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+        if entry is None or entry[0] <= now or entry[1] < self.limit:
+            return 0
+        return int(entry[0] - now) + 1
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            expires, count = self._counts.get(key, (0, 0))
+            if expires <= now:
+                expires, count = now + self.window, 0
+            if len(self._counts) >= self.max_keys and key not in self._counts:
+                self._evict(now)
+            self._counts[key] = (expires, count + 1)
+
+    def reset(self, key):
+        with self._lock:
+            self._counts.pop(key, None)
+
+    def _evict(self, now):
+        stale = [k for k, (expires, _) in self._counts.items() if expires <= now]
+        for k in stale or list(self._counts)[: self.max_keys // 10]:
+            del self._counts[k]
+
+
+class PasswordHasher:
+    """Runs the password KDF on a small bounded thread pool.
+
+    hashlib's scrypt/pbkdf2 release the GIL, so the pool caps how many
+    cores logins can take per worker; once PASSWORD_HASH_QUEUE calls are
+    waiting, new ones fail fast with HasherBusy instead of piling up.
+    """
+
+    def __init__(self):
+        self.method = normalize_method("scrypt")
+        self.max_workers = 2
+        self.max_queue = 8
+        self.timeout = 5.0
+        self.by_phone = AttemptLimiter(5, 300)
+        self.by_ip = AttemptLimiter(30, 60)
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("PASSWORD_HASH_METHOD", "scrypt")
+        app.config.setdefault("PASSWORD_HASH_WORKERS", 2)
+        app.config.setdefault("PASSWORD_HASH_QUEUE", 8)
+        app.config.setdefault("PASSWORD_HASH_TIMEOUT", 5.0)
+        app.config.setdefault("LOGIN_FAILURES_PER_PHONE", 5)
+        app.config.setdefault("LOGIN_FAILURE_WINDOW", 300)
+        app.config.setdefault("AUTH_ATTEMPTS_PER_IP", 30)
+        app.config.setdefault("AUTH_ATTEMPT_WINDOW", 60)
+
+        self.method = normalize_method(app.config["PASSWORD_HASH_METHOD"])
+        self.max_workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.max_queue = app.config["PASSWORD_HASH_QUEUE"]
+        self.timeout = app.config["PASSWORD_HASH_TIMEOUT"]
+        self.by_phone = AttemptLimiter(
+            app.config["LOGIN_FAILURES_PER_PHONE"], app.config["LOGIN_FAILURE_WINDOW"]
+        )
+        self.by_ip = AttemptLimiter(
+            app.config["AUTH_ATTEMPTS_PER_IP"], app.config["AUTH_ATTEMPT_WINDOW"]
+        )
+        app.extensions["passwords"] = self
+
+    # -- throttling --------------------------------------------------------
+
+    def check_attempt(self, phone, ip):
+        """Count an attempt from ip; raise Throttled if phone or ip is over its limit."""
+        wait = max(self.by_phone.retry_after(phone), self.by_ip.retry_after(ip))
+        if wait:
+            metrics.count_auth_rejection("throttled")
+            raise Throttled(wait)
+        self.by_ip.hit(ip)
+
+    def record_failure(self, phone):
+        self.by_phone.hit(phone)
+
+    def record_success(self, phone):
+        self.by_phone.reset(phone)
+
+    # -- hashing -----------------------------------------------------------
+
+    def hash(self, password):
+        return self._run("hash", generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        return self._run("verify", check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        return stored_hash.split("$", 1)[0] != self.method
+
+    def _run(self, op, fn, *args):
+        with self._lock:
+            # threads don't survive fork; a preloaded master never hashes,
+            # but build the pool (and its admission count) per process to be safe
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="kdf")
+                self._pid = os.getpid()
+                self._pending = 0
+            if self._pending >= self.max_workers + self.max_queue:
+                metrics.count_auth_rejection("busy")
+                raise HasherBusy()
+            self._pending += 1
+            executor = self._executor
+
+        try:
+            future = executor.submit(self._timed, op, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # a KDF that is already running can't be cancelled, so the slot is
+        # given back when the work actually ends, not when we stop waiting
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            metrics.count_auth_rejection("timeout")
+            raise HasherBusy() from None
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    @staticmethod
+    def _timed(op, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            metrics.observe_kdf(op, time.perf_counter() - start)
+
+
+passwords = PasswordHasher()
@@ -0,0 +1,265 @@
+# app/qr.py
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import qrcode
+import qrcode.image.svg
+from flask import Response, abort, current_app, request
+
+from . import db
+
+# bump when the rendering settings change so old ETags / disk files go stale
+RENDER_VERSION = "2"
+
+MIMETYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+ERROR_CORRECTION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,   # ~7% recoverable, fewest modules
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+# the only sizes and borders served: every combination is a separate cache
+# entry and disk file, so keep the set small
+BOX_SIZES = (4, 8, 10, 16)
+BORDERS = (0, 2, 4)
+
+
+class _Call:
+    """An in-flight render that other threads can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QRCache:
+    """Rendered QR images keyed on (path, url_root, format, size, border, ec).
+
+    Lookups go memory LRU -> on-disk store -> render. Concurrent misses for
+    the same key share one render (single-flight). The disk store holds at
+    most max_files images; the oldest are pruned past that.
+    """
+
+    # re-count the directory every this many writes (per process)
+    PRUNE_EVERY = 64
+
+    def __init__(self, max_entries=512, directory=None, max_files=10000):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_files = max_files
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def init_app(self, app):
+        app.config.setdefault("QR_CACHE_SIZE", 512)
+        app.config.setdefault("QR_CACHE_DIR", os.path.join(app.instance_path, "qr_cache"))
+        app.config.setdefault("QR_CACHE_MAX_FILES", 10000)
+        app.config.setdefault("QR_CACHE_MAX_AGE", 86400)
+
+        self.max_entries = app.config["QR_CACHE_SIZE"]
+        self.directory = app.config["QR_CACHE_DIR"]
+        self.max_files = app.config["QR_CACHE_MAX_FILES"]
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.extensions["qr_cache"] = self
+
+    @staticmethod
+    def etag_for(key):
+        raw = "|".join([RENDER_VERSION] + [str(part) for part in key])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def get(self, key, render):
+        """Return image bytes for key, calling render() only on a full miss."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            data = self._load(key)
+            if data is None:
+                data = render()
+                self._store(key, data)
+            call.value = data
+            self._remember(key, data)
+            return data
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # -- internals ---------------------------------------------------------
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{self.etag_for(key)}.{key[2]}")
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def _store(self, key, data):
+        if not self.directory:
+            return
+        # write-then-rename so readers in other workers never see half a file
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.PRUNE_EVERY == 1
+        if due:
+            self._prune()
+
+    def _prune(self):
+        """Drop the oldest files once the store is over max_files."""
+        try:
+            files = [e for e in os.scandir(self.directory) if e.is_file() and not e.name.endswith(".tmp")]
+        except OSError:
+            return
+        excess = len(files) - self.max_files
+        if excess <= 0:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        # prune a little below the cap so the next scan isn't straight away
+        for entry in files[:excess + self.max_files // 10]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+
+qr_cache = QRCache()
+
+
+def render_qr(link, fmt="png", size=10, border=4, ec="M"):
+    qr = qrcode.QRCode(box_size=size, border=border, error_correction=ERROR_CORRECTION[ec])
+    qr.add_data(link)
+    qr.make(fit=True)
+    buf = io.BytesIO()
+    if fmt == "svg":
+        # pure-Python path output; Pillow never draws or encodes anything
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buf)
+    else:
+        qr.make_image().save(buf, fmt.upper())
+    return buf.getvalue()
+
+
+def _int_arg(name, default, choices):
+    raw = request.args.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        abort(400)
+    if value not in choices:
+        abort(400)
+    return value
+
+
+def qr_options(fmt=None, size=None):
+    """Format, box size, border and error correction for this request.
+
+    ?format= wins; otherwise SVG is served only to clients that list
+    image/svg+xml in Accept, so plain fetches keep getting a PNG.
+    ?size and ?border must be one of BOX_SIZES / BORDERS.
+    Returns (fmt, size, border, ec, negotiated).
+    """
+    negotiated = False
+    fmt = fmt or request.args.get("format")
+    if fmt is None:
+        negotiated = True
+        explicit = [value for value, quality in request.accept_mimetypes if quality]
+        fmt = "svg" if "image/svg+xml" in explicit else "png"
+    if fmt not in MIMETYPES:
+        abort(400)
+
+    size = size or _int_arg("size", 10, BOX_SIZES)
+    border = _int_arg("border", 4, BORDERS)
+    ec = request.args.get("ec", "M").upper()
+    if ec not in ERROR_CORRECTION:
+        abort(400)
+    return fmt, size, border, ec, negotiated
+
+
+def qr_response(code, path, model, fmt=None, size=None, max_age=None):
+    """Serve the QR for request.url_root + path with ETag / 304 support.
+
+    The image is keyed on the link itself, so the voucher and payment QR
+    for the same code never share an entry. Nothing is rendered (or stored)
+    for a code that has no `model` row.
+    """
+    fmt, size, border, ec, negotiated = qr_options(fmt, size)
+    key = (path, request.url_root, fmt, size, border, ec)
+    etag = qr_cache.etag_for(key)
+    if max_age is None:
+        max_age = current_app.config.get("QR_CACHE_MAX_AGE", 86400)
+
+    # the ETag is derived from the key, so a revalidation never touches the cache
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        link = f"{request.url_root}{path}"
+
+        def render():
+            # only on a full miss, so cached codes cost no query
+            if db.session.query(model.id).filter_by(code=code).first() is None:
+                abort(404)
+            return render_qr(link, fmt, size, border, ec)
+
+        data = qr_cache.get(key, render)
+        resp = Response(data, mimetype=MIMETYPES[fmt])
+
+    if negotiated:
+        resp.vary.add("Accept")
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = max_age
+    return resp
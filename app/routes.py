@@ -2,33 +2,47 @@
 from functools import wraps
 from flask import (
     Blueprint, render_template, redirect, url_for,
-    request, flash, jsonify, send_file, current_app
+    request, flash, jsonify, current_app, Response, abort, send_from_directory
 )
 from flask_login import (
     login_required, login_user, logout_user,
     current_user
 )
-from werkzeug.security import generate_password_hash, check_password_hash
 from . import db
-from .models import User, MerchantPayment, Voucher
-import io
-import qrcode
+from .models import (
+    User, MerchantPayment, Voucher, Product, CartItem, MarketplaceOrder,
+    WalletTransactionArchive, DailySpend
+)
+from .qr import qr_response
+from .vouchers import mint_vouchers, iter_codes_csv
+from . import stats
+from .wallet import (
+    debit, credit, transfer, InsufficientFunds, CATEGORY_LABELS,
+    MOBILE, ELECTRICITY, DIGITAL_VOUCHERS, LOTTO, MERCHANT_PAYMENT, MERCHANT_INCOME,
+    MARKETPLACE, VOUCHER_REDEEMED
+)
+from .pagination import encode_cursor, decode_cursor
+from .templating import template_resolver
+from .metrics import metrics
+from .passwords import passwords, HasherBusy, Throttled
+from .idempotency import idempotent
+from .fulfilment import enqueue
+from .marketplace_routes import product_details
+from .images import product_images, probe, InvalidImage
+from .exports import export_response, ExportError
+from .archive import hot_horizon
+from sqlalchemy import and_, or_, func, case
+from sqlalchemy.orm import joinedload
 import datetime
+import math
 import secrets
 
 bp = Blueprint("main", __name__)
 
 # Helper: render primary template, fallback to alt if primary not found
 def render_flexible_template(primary, alt=None, **context):
-    """Try to render primary template; if TemplateNotFound, render alt (if provided)."""
-    try:
-        return render_template(primary, **context)
-    except Exception as e:
-        # only attempt fallback for missing template errors
-        from jinja2 import TemplateNotFound
-        if alt and isinstance(e, TemplateNotFound):
-            return render_template(alt, **context)
-        raise
+    """Render primary if it exists, else alt (resolved once at startup, see app/templating.py)."""
+    return render_template(template_resolver.resolve(primary, alt), **context)
 
 # Admin guard
 def admin_required(f):
@@ -52,18 +66,41 @@ def home():
 # ---------------------------------------------------------
 # AUTH: LOGIN / REGISTER / LOGOUT
 # ---------------------------------------------------------
+def _auth_refused(template, retry_after):
+    """429 back to the form, without spending a KDF call."""
+    flash("Too many attempts. Please wait a moment and try again.", "danger")
+    return render_flexible_template(template), 429, {"Retry-After": str(retry_after)}
+
 @bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         phone = request.form.get("phone")
         password = request.form.get("password")
 
-        user = User.query.filter_by(phone=phone).first()
-
-        if not user or not check_password_hash(user.password, password):
+        try:
+            passwords.check_attempt(phone, request.remote_addr)
+            user = User.query.filter_by(phone=phone).first()
+            ok = user is not None and passwords.verify(user.password, password)
+        except Throttled as e:
+            return _auth_refused("login.html", e.retry_after)
+        except HasherBusy:
+            return _auth_refused("login.html", 1)
+
+        if not ok:
+            passwords.record_failure(phone)
             flash("Invalid login details", "danger")
             return redirect(url_for("main.login"))
 
+        passwords.record_success(phone)
+        if passwords.needs_rehash(user.password):
+            # hash parameters changed since this one was stored; upgrade it now
+            # that we have the plaintext (best effort, the login stands either way)
+            try:
+                user.password = passwords.hash(password)
+                db.session.commit()
+            except HasherBusy:
+                pass
+
         login_user(user)
         return redirect(url_for("main.dashboard"))
 
@@ -75,17 +112,28 @@ def register():
         phone = request.form.get("phone")
         password = request.form.get("password")
 
+        try:
+            passwords.check_attempt(phone, request.remote_addr)
+        except Throttled as e:
+            return _auth_refused("register.html", e.retry_after)
+
         if User.query.filter_by(phone=phone).first():
             flash("Phone already registered.", "danger")
             return redirect(url_for("main.register"))
 
+        try:
+            password_hash = passwords.hash(password)
+        except HasherBusy:
+            return _auth_refused("register.html", 1)
+
         new_user = User(
             phone=phone,
-            password=generate_password_hash(password),
+            password=password_hash,
             wallet_balance=0,
             created_at=datetime.datetime.utcnow()
         )
         db.session.add(new_user)
+        stats.bump(users=1)
         db.session.commit()
 
         flash("Registration successful!", "success")
@@ -108,34 +156,143 @@ def dashboard():
     # use getattr so missing column doesn't crash
     wallet = getattr(current_user, "wallet_balance", 0) or 0
     # simple stats for small card widgets (can be expanded)
-    total_vouchers = Voucher.query.count()
-    total_payments = MerchantPayment.query.count()
+    platform = stats.get_stats()
+    spend = _month_spend(current_user.id)
     return render_flexible_template(
         "dashboard.html",
         wallet=wallet,
-        total_vouchers=total_vouchers,
-        total_payments=total_payments
+        total_vouchers=int(platform[stats.VOUCHERS]),
+        total_payments=int(platform[stats.PAYMENTS]),
+        month_spend=spend,
+        month_spend_total=sum(amount for _, amount in spend)
+    )
+
+def _month_spend(user_id):
+    """[(label, amount)] spent this calendar month, largest first.
+
+    A range read of the daily_spend primary key: at most ~31 days x a few
+    categories, however long the user's history is.
+    """
+    today = datetime.datetime.utcnow().date()  # rollup days are UTC, like created_at
+    rows = db.session.query(
+        DailySpend.category, func.sum(DailySpend.amount)
+    ).filter(
+        DailySpend.user_id == user_id, DailySpend.day >= today.replace(day=1)
+    ).group_by(DailySpend.category).all()
+    return sorted(
+        ((CATEGORY_LABELS.get(category, category), amount) for category, amount in rows if amount > 0.005),
+        key=lambda item: -item[1]
     )
 
 # Admin dashboard: totals and quick actions
 @bp.route("/admin")
 @admin_required
 def admin_dashboard():
-    total_users = User.query.count()
-    total_vouchers = Voucher.query.count()
-    total_payments = MerchantPayment.query.count()
-    # sum of all wallet balances (guard missing attribute)
-    users = User.query.all()
-    total_balance = sum(getattr(u, "wallet_balance", 0) or 0 for u in users)
+    # counters are maintained by the write paths (see app/stats.py)
+    platform = stats.get_stats()
 
     return render_flexible_template(
         "admin/dashboard.html",
-        total_users=total_users,
-        total_vouchers=total_vouchers,
-        total_payments=total_payments,
-        total_balance=total_balance
+        total_users=int(platform[stats.USERS]),
+        total_vouchers=int(platform[stats.VOUCHERS]),
+        total_payments=int(platform[stats.PAYMENTS]),
+        total_balance=platform[stats.WALLET_BALANCE]
+    )
+
+ADMIN_USERS_PAGE_SIZE = 50
+
+def _phone_prefix(prefix):
+    """WHERE clause for phones starting with prefix that can use an index."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        # served by ix_users_phone_pattern (text_pattern_ops); the prefix is
+        # digits and "+" only, so there is nothing to escape
+        return User.phone.like(prefix + "%")
+    # a half-open range is a plain index range scan on SQLite
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(User.phone >= prefix, User.phone < upper)
+
+def _users_page(phone, admin, min_balance, max_balance, after):
+    """One keyset page of the admin directory, newest first; returns (users, next_cursor)."""
+    q = User.query
+    if phone:
+        q = q.filter(_phone_prefix(phone))
+    if admin in ("yes", "no"):
+        q = q.filter(User.is_admin.is_(admin == "yes"))
+    if min_balance is not None:
+        q = q.filter(User.wallet_balance >= min_balance)
+    if max_balance is not None:
+        q = q.filter(User.wallet_balance <= max_balance)
+
+    cursor = decode_cursor(after, datetime.datetime, int)
+    if cursor:
+        created_at, user_id = cursor
+        q = q.filter(or_(
+            User.created_at < created_at,
+            and_(User.created_at == created_at, User.id > user_id)
+        ))
+    # same direction as ix_users_created
+    users = q.order_by(User.created_at.desc(), User.id.asc()).limit(ADMIN_USERS_PAGE_SIZE + 1).all()
+
+    next_cursor = None
+    if len(users) > ADMIN_USERS_PAGE_SIZE:
+        users = users[:ADMIN_USERS_PAGE_SIZE]
+        next_cursor = encode_cursor(users[-1].created_at, users[-1].id)
+    return users, next_cursor
+
+def _wallet_summaries(user_ids):
+    """{user_id: totals dict} for a page of users: one grouped query per ledger table."""
+    summaries = {}
+    if not user_ids:
+        return summaries
+    for model in (WalletTransaction, WalletTransactionArchive):
+        amount = model.amount
+        rows = db.session.query(
+            model.user_id,
+            func.count(model.id),
+            func.coalesce(func.sum(case((amount > 0, amount))), 0),
+            func.coalesce(-func.sum(case((amount < 0, amount))), 0),
+            func.max(model.created_at),
+        ).filter(model.user_id.in_(user_ids)).group_by(model.user_id)
+        for user_id, count, credited, debited, last in rows:
+            s = summaries.setdefault(
+                user_id, {"tx_count": 0, "credited": 0, "debited": 0, "last_activity": None}
+            )
+            s["tx_count"] += count
+            s["credited"] += credited
+            s["debited"] += debited
+            if last and (s["last_activity"] is None or last > s["last_activity"]):
+                s["last_activity"] = last
+    return summaries
+
+# Admin user directory: ?phone=<prefix>&admin=yes|no&min_balance=&max_balance=&after=<cursor>
+@bp.route("/admin/users")
+@admin_required
+def admin_users():
+    phone = "".join(ch for ch in request.args.get("phone", "") if ch.isdigit() or ch == "+")
+    admin = request.args.get("admin", "")
+    min_balance = request.args.get("min_balance", type=float)
+    max_balance = request.args.get("max_balance", type=float)
+    after = request.args.get("after")
+
+    users, next_cursor = _users_page(phone, admin, min_balance, max_balance, after)
+    return render_template(
+        "admin_users.html",
+        users=users,
+        summaries=_wallet_summaries([u.id for u in users]),
+        next_cursor=next_cursor,
+        is_first_page=not after,
+        filters={"phone": phone, "admin": admin, "min_balance": min_balance, "max_balance": max_balance},
     )
 
+# Prometheus scrape endpoint: admins, or a scraper presenting METRICS_TOKEN
+@bp.route("/admin/metrics")
+def admin_metrics():
+    token = current_app.config.get("METRICS_TOKEN")
+    if not (token and secrets.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")):
+        if not (current_user.is_authenticated and getattr(current_user, "is_admin", False)):
+            abort(403)
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 # ---------------------------------------------------------
 # PROFILE PAGE
 # ---------------------------------------------------------
@@ -156,14 +313,77 @@ def wallet():
     balance = getattr(current_user, "wallet_balance", 0) or 0
     return render_flexible_template("wallet.html", transactions=transactions, balance=balance)
 
+TRANSACTIONS_PAGE_SIZE = 50
+
+def _history_rows(model, user_id, cursor, limit):
+    q = model.query.filter(model.user_id == user_id)
+    if cursor:
+        created_at, tx_id = cursor
+        q = q.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id > tx_id)
+        ))
+    # same direction as the (user_id, created_at DESC, id) indexes, so no sort step
+    return q.order_by(model.created_at.desc(), model.id.asc()).limit(limit).all()
+
+def _transactions_page(user_id, before):
+    """One keyset page of a user's history, newest first.
+
+    `before` is an opaque cursor from a previous page; returns (rows, next_cursor).
+    The archive is only read once the page reaches back past the hot horizon.
+    """
+    cursor = decode_cursor(before, datetime.datetime, int)
+    rows = _history_rows(WalletTransaction, user_id, cursor, TRANSACTIONS_PAGE_SIZE + 1)
+    if len(rows) <= TRANSACTIONS_PAGE_SIZE or rows[-1].created_at < hot_horizon():
+        rows += _history_rows(WalletTransactionArchive, user_id, cursor, TRANSACTIONS_PAGE_SIZE + 1)
+        rows.sort(key=lambda tx: (tx.created_at, -tx.id), reverse=True)
+        rows = rows[:TRANSACTIONS_PAGE_SIZE + 1]
+
+    next_cursor = None
+    if len(rows) > TRANSACTIONS_PAGE_SIZE:
+        rows = rows[:TRANSACTIONS_PAGE_SIZE]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
 @bp.route("/transactions")
 @login_required
 def transactions():
-    txs = WalletTransaction.query.filter_by(user_id=current_user.id).order_by(
-        WalletTransaction.created_at.desc()
-    ).all()
+    before = request.args.get("before")
+    txs, next_cursor = _transactions_page(current_user.id, before)
+
+    return render_template(
+        "transactions.html",
+        transactions=txs,
+        next_cursor=next_cursor,
+        is_first_page=not before
+    )
 
-    return render_template("transactions.html", transactions=txs)
+@bp.route("/transactions/page")
+@login_required
+def transactions_page():
+    # JSON variant of /transactions for infinite scroll
+    txs, next_cursor = _transactions_page(current_user.id, request.args.get("before"))
+    return jsonify(
+        transactions=[
+            {
+                "id": tx.id,
+                "type": tx.type,
+                "amount": tx.amount,
+                "created_at": tx.created_at.isoformat() if tx.created_at else None,
+            }
+            for tx in txs
+        ],
+        next=next_cursor
+    )
+
+@bp.route("/transactions/export.<any(csv, jsonl):fmt>")
+@login_required
+def transactions_export(fmt):
+    try:
+        return export_response("transactions", current_user.id, fmt, request.args)
+    except ExportError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("main.transactions"))
 
 # ---------------------------------------------------------
 # UTILITIES (CLEAN / FINAL VERSION)
@@ -174,6 +394,7 @@ from .models import WalletTransaction  # make sure this import exists
 # ---------- MOBILE ----------
 @bp.route("/utility/mobile", methods=["GET", "POST"])
 @login_required
+@idempotent
 def utility_mobile():
     if request.method == "POST":
         amount = float(request.form.get("amount", 0))
@@ -183,23 +404,17 @@ def utility_mobile():
             flash("Invalid mobile purchase details", "danger")
             return redirect(url_for("main.utility_mobile"))
 
-        if current_user.wallet_balance < amount:
+        # Deduct + log transaction
+        try:
+            debit(current_user.id, amount, f"Mobile ({network})", MOBILE, network)
+        except InsufficientFunds:
+            db.session.rollback()
             flash("Insufficient wallet balance!", "danger")
             return redirect(url_for("main.utility_mobile"))
-
-        # Deduct
-        current_user.wallet_balance -= amount
-
-        # Log transaction
-        tx = WalletTransaction(
-            user_id=current_user.id,
-            type=f"Mobile ({network})",
-            amount=amount
-        )
-        db.session.add(tx)
+        enqueue(current_user.id, "mobile", amount, f"{network} {request.form.get('phone') or ''}".strip())
         db.session.commit()
 
-        flash(f"Successfully purchased R{amount} {network} airtime/data!", "success")
+        flash(f"R{amount} {network} airtime/data is on its way!", "success")
         return redirect(url_for("main.wallet"))
 
     return render_template("utilities/mobile.html")
@@ -208,6 +423,7 @@ def utility_mobile():
 # ---------- ELECTRICITY ----------
 @bp.route("/utility/electricity", methods=["GET", "POST"])
 @login_required
+@idempotent
 def utility_electricity():
     if request.method == "POST":
         amount = float(request.form.get("amount", 0))
@@ -217,21 +433,16 @@ def utility_electricity():
             flash("Invalid electricity details", "danger")
             return redirect(url_for("main.utility_electricity"))
 
-        if current_user.wallet_balance < amount:
+        try:
+            debit(current_user.id, amount, f"Electricity (Meter {meter})", ELECTRICITY, meter)
+        except InsufficientFunds:
+            db.session.rollback()
             flash("Insufficient wallet balance!", "danger")
             return redirect(url_for("main.utility_electricity"))
-
-        current_user.wallet_balance -= amount
-
-        tx = WalletTransaction(
-            user_id=current_user.id,
-            type=f"Electricity (Meter {meter})",
-            amount=amount
-        )
-        db.session.add(tx)
+        enqueue(current_user.id, "electricity", amount, f"Meter {meter}")
         db.session.commit()
 
-        flash(f"Electricity token purchased for meter {meter}!", "success")
+        flash(f"Electricity token for meter {meter} is being issued!", "success")
         return redirect(url_for("main.wallet"))
 
     return render_template("utilities/electricity.html")
@@ -240,6 +451,7 @@ def utility_electricity():
 # ---------- DIGITAL VOUCHERS ----------
 @bp.route("/utility/vouchers", methods=["GET", "POST"])
 @login_required
+@idempotent
 def utility_vouchers():
     if request.method == "POST":
         brand = request.form.get("brand")
@@ -249,21 +461,16 @@ def utility_vouchers():
             flash("Invalid voucher purchase details", "danger")
             return redirect(url_for("main.utility_vouchers"))
 
-        if current_user.wallet_balance < amount:
+        try:
+            debit(current_user.id, amount, f"Digital Voucher ({brand})", DIGITAL_VOUCHERS, brand)
+        except InsufficientFunds:
+            db.session.rollback()
             flash("Not enough wallet balance", "danger")
             return redirect(url_for("main.utility_vouchers"))
-
-        current_user.wallet_balance -= amount
-
-        tx = WalletTransaction(
-            user_id=current_user.id,
-            type=f"Digital Voucher ({brand})",
-            amount=amount
-        )
-        db.session.add(tx)
+        enqueue(current_user.id, "vouchers", amount, brand)
         db.session.commit()
 
-        flash(f"You purchased a {brand} voucher!", "success")
+        flash(f"Your {brand} voucher is being issued!", "success")
         return redirect(url_for("main.wallet"))
 
     return render_template("utilities/vouchers.html")
@@ -272,6 +479,7 @@ def utility_vouchers():
 # ---------- LOTTO ----------
 @bp.route("/utility/lotto", methods=["GET", "POST"])
 @login_required
+@idempotent
 def utility_lotto():
     if request.method == "POST":
         ticket_type = request.form.get("ticket")
@@ -281,21 +489,16 @@ def utility_lotto():
             flash("Invalid Lotto ticket details", "danger")
             return redirect(url_for("main.utility_lotto"))
 
-        if current_user.wallet_balance < price:
+        try:
+            debit(current_user.id, price, f"Lotto ({ticket_type})", LOTTO, ticket_type)
+        except InsufficientFunds:
+            db.session.rollback()
             flash("Insufficient wallet balance", "danger")
             return redirect(url_for("main.utility_lotto"))
-
-        current_user.wallet_balance -= price
-
-        tx = WalletTransaction(
-            user_id=current_user.id,
-            type=f"Lotto ({ticket_type})",
-            amount=price
-        )
-        db.session.add(tx)
+        enqueue(current_user.id, "lotto", price, ticket_type)
         db.session.commit()
 
-        flash("Lotto ticket purchased!", "success")
+        flash("Lotto ticket purchase submitted!", "success")
         return redirect(url_for("main.wallet"))
 
     return render_template("utilities/lotto.html")
@@ -322,6 +525,8 @@ def create_merchant_payment():
         try:
             amount = float(request.form.get("amount"))
         except (TypeError, ValueError):
+            amount = 0
+        if amount <= 0:
             flash("Invalid amount", "danger")
             return redirect(url_for("main.create_merchant_payment"))
         description = request.form.get("description", "")
@@ -336,6 +541,7 @@ def create_merchant_payment():
             created_at=datetime.datetime.utcnow()
         )
         db.session.add(mp)
+        stats.bump(payments=1)
         db.session.commit()
 
         return redirect(url_for("main.view_merchant_payment", code=code))
@@ -351,33 +557,37 @@ def view_merchant_payment(code):
 @bp.route("/merchant/payment/<code>/qrcode")
 def merchant_payment_qrcode(code):
     # produce QR linking to /merchant/pay/<code>
-    link = f"{request.url_root}merchant/pay/{code}"
-    qr = qrcode.make(link)
-    buf = io.BytesIO()
-    qr.save(buf, "PNG")
-    buf.seek(0)
-    return send_file(buf, mimetype="image/png")
+    return qr_response(code, f"merchant/pay/{code}", MerchantPayment)
 
 @bp.route("/merchant/pay/<code>", methods=["GET", "POST"])
 @login_required
+@idempotent
 def pay_merchant(code):
     mp = MerchantPayment.query.filter_by(code=code).first_or_404()
     merchant = User.query.get(mp.merchant_id)
 
-    # guard missing wallet_balance
-    payer_balance = getattr(current_user, "wallet_balance", 0) or 0
-    merchant_balance = getattr(merchant, "wallet_balance", 0) or 0
-
     if request.method == "POST":
-        if payer_balance < mp.amount:
+        # flip the status only if still pending so a payment is never paid
+        # (or counted in payments_paid) twice; a failed transfer rolls it back
+        claimed = MerchantPayment.query.filter_by(id=mp.id, status="pending").update(
+            {"status": "paid", "paid_at": datetime.datetime.utcnow()},
+            synchronize_session=False
+        )
+        if not claimed:
+            flash("This payment has already been made.", "danger")
+            return redirect(url_for("main.wallet"))
+
+        try:
+            transfer(
+                current_user.id, mp.merchant_id, mp.amount, f"Merchant payment ({code})",
+                MERCHANT_PAYMENT, code, payee_category=MERCHANT_INCOME
+            )
+        except InsufficientFunds:
+            db.session.rollback()
             flash("Insufficient wallet balance", "danger")
             return redirect(url_for("main.pay_merchant", code=code))
 
-        current_user.wallet_balance = payer_balance - mp.amount
-        merchant.wallet_balance = merchant_balance + mp.amount
-
-        mp.status = "paid"
-        mp.paid_at = datetime.datetime.utcnow()
+        stats.bump(payments_paid=1)
         db.session.commit()
 
         flash("Payment successful", "success")
@@ -392,6 +602,16 @@ def merchant_payment_list():
     records = MerchantPayment.query.filter_by(merchant_id=current_user.id).all()
     return render_flexible_template("merchant/payment_list.html", payments=records)
 
+@bp.route("/merchant/payments/export.<any(csv, jsonl):fmt>")
+@login_required
+def merchant_payment_export(fmt):
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD&status=paid,pending
+    try:
+        return export_response("payments", current_user.id, fmt, request.args)
+    except ExportError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("main.merchant_payment_list"))
+
 # =
 # VOUCHER SYSTEM
 # =
@@ -405,6 +625,9 @@ def create_voucher():
         except (TypeError, ValueError):
             flash("Invalid amount", "danger")
             return redirect(url_for("main.create_voucher"))
+        if not (math.isfinite(amount) and amount > 0):
+            flash("Amount must be positive", "danger")
+            return redirect(url_for("main.create_voucher"))
 
         code = secrets.token_urlsafe(6)
         v = Voucher(
@@ -415,42 +638,76 @@ def create_voucher():
             created_at=datetime.datetime.utcnow()
         )
         db.session.add(v)
+        stats.bump(vouchers=1)
         db.session.commit()
         return redirect(url_for("main.voucher_created", code=code))
 
     return render_flexible_template("voucher/create_voucher.html")
 
+@bp.route("/merchant/vouchers/bulk", methods=["GET", "POST"])
+@login_required
+def bulk_mint_vouchers():
+    # mint many vouchers at once and download the codes as CSV
+    if request.method == "POST":
+        data = request.get_json(silent=True) or request.form
+        try:
+            amount = float(data.get("amount"))
+            count = int(data.get("count"))
+        except (TypeError, ValueError):
+            flash("Invalid amount or count", "danger")
+            return redirect(url_for("main.bulk_mint_vouchers"))
+
+        max_count = current_app.config.get("VOUCHER_BULK_MAX", 100000)
+        if not (math.isfinite(amount) and amount > 0) or count <= 0 or count > max_count:
+            flash(f"Amount must be positive and count between 1 and {max_count}", "danger")
+            return redirect(url_for("main.bulk_mint_vouchers"))
+
+        codes = mint_vouchers(current_user.id, amount, count)
+        filename = f"vouchers-{datetime.datetime.utcnow():%Y%m%d%H%M%S}.csv"
+        return Response(
+            iter_codes_csv(codes, amount),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+
+    return render_flexible_template("voucher/bulk_mint.html")
+
 @bp.route("/voucher/created/<code>")
 @login_required
 def voucher_created(code):
     v = Voucher.query.filter_by(code=code).first_or_404()
-    qr_url = url_for("main.voucher_qrcode", code=code)
+    qr_url = url_for("main.voucher_qrcode", code=code, format="svg")
     redeem_url = url_for("main.redeem_voucher", code=code)
     return render_flexible_template("voucher/voucher_created.html", voucher=v, qr_url=qr_url, redeem_url=redeem_url)
 
 @bp.route("/voucher/<code>/qrcode")
 def voucher_qrcode(code):
-    link = f"{request.url_root}redeem/{code}"
-    qr = qrcode.make(link)
-    buf = io.BytesIO()
-    qr.save(buf, "PNG")
-    buf.seek(0)
-    return send_file(buf, mimetype="image/png")
+    return qr_response(code, f"redeem/{code}", Voucher)
 
 @bp.route("/redeem/<code>", methods=["GET", "POST"])
 @login_required
+@idempotent
 def redeem_voucher(code):
     # Support showing a redeem confirmation (GET) and performing redeem (POST)
     v = Voucher.query.filter_by(code=code).first_or_404()
 
     if request.method == "POST":
-        if v.status != "active":
+        # vouchers minted before amounts were validated can't be credited
+        if not v.amount or not (math.isfinite(v.amount) and v.amount > 0):
+            flash("Voucher already used or invalid.", "danger")
+            return redirect(url_for("main.wallet"))
+
+        # flip the status only if still active so two redeems can't both credit
+        claimed = Voucher.query.filter_by(id=v.id, status="active").update(
+            {"status": "redeemed", "redeemed_at": datetime.datetime.utcnow()},
+            synchronize_session=False
+        )
+        if not claimed:
             flash("Voucher already used or invalid.", "danger")
             return redirect(url_for("main.wallet"))
 
-        current_user.wallet_balance = (getattr(current_user, "wallet_balance", 0) or 0) + v.amount
-        v.status = "redeemed"
-        v.redeemed_at = datetime.datetime.utcnow()
+        credit(current_user.id, v.amount, f"Voucher redeemed ({code})", VOUCHER_REDEEMED, code)
+        stats.bump(vouchers_redeemed=1)
         db.session.commit()
 
         flash("Voucher redeemed successfully!", "success")
@@ -466,6 +723,15 @@ def merchant_voucher_list():
     vouchers = Voucher.query.filter_by(creator_id=current_user.id).all()
     return render_flexible_template("voucher/voucher_list.html", vouchers=vouchers)
 
+@bp.route("/merchant/vouchers/export.<any(csv, jsonl):fmt>")
+@login_required
+def merchant_voucher_export(fmt):
+    try:
+        return export_response("vouchers", current_user.id, fmt, request.args)
+    except ExportError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("main.merchant_voucher_list"))
+
 @bp.route("/redeem", methods=["GET", "POST"])
 @login_required
 def redeem_page():
@@ -484,7 +750,9 @@ def marketplace_index():
 @bp.route("/marketplace/product/<int:pid>")
 @login_required
 def marketplace_product(pid):
-    p = Product.query.get_or_404(pid)
+    p = product_details(pid)
+    if p is None:
+        abort(404)
     return render_flexible_template("marketplace/product.html", product=p)
 
 # Add to cart (POST)
@@ -504,11 +772,25 @@ def cart_add():
     flash("Added to cart", "success")
     return redirect(url_for("main.marketplace_index"))
 
+def _cart_summary(user_id):
+    """(total, item count, highest cart_items.id) for a user's cart in one query."""
+    total, count, max_id = db.session.query(
+        func.coalesce(func.sum(Product.price * CartItem.qty), 0),
+        func.count(CartItem.id),
+        func.max(CartItem.id)
+    ).join(Product, CartItem.product_id == Product.id).filter(
+        CartItem.user_id == user_id
+    ).one()
+    return total, count, max_id
+
 @bp.route("/marketplace/cart")
 @login_required
 def cart_view():
-    items = CartItem.query.filter_by(user_id=current_user.id).all()
-    total = sum((it.product.price or 0) * it.qty for it in items)
+    # products come in with the items via one JOIN instead of a lazy load per row
+    items = CartItem.query.options(joinedload(CartItem.product)).filter_by(
+        user_id=current_user.id
+    ).all()
+    total, _, _ = _cart_summary(current_user.id)
     return render_flexible_template("marketplace/cart.html", items=items, total=total)
 
 @bp.route("/marketplace/cart/remove/<int:item_id>", methods=["POST"])
@@ -526,30 +808,40 @@ def cart_remove(item_id):
 # Checkout: deduct wallet and create order (prototype: instant success)
 @bp.route("/marketplace/checkout", methods=["POST"])
 @login_required
+@idempotent
 def marketplace_checkout():
-    items = CartItem.query.filter_by(user_id=current_user.id).all()
-    if not items:
+    total, count, max_id = _cart_summary(current_user.id)
+    if not count:
         flash("Cart empty", "danger")
         return redirect(url_for("main.cart_view"))
-    total = sum((it.product.price or 0) * it.qty for it in items)
 
-    user_balance = getattr(current_user, "wallet_balance", 0) or 0
-    if user_balance < total:
+    if total < 0:
+        flash("Invalid cart total", "danger")
+        return redirect(url_for("main.cart_view"))
+
+    # (simulate) create external_order_id; it is also the ledger reference
+    external_order_id = f"SIM-{secrets.token_urlsafe(6)}"
+
+    try:
+        # a cart of free items places the order without a ledger entry
+        if total > 0:
+            debit(current_user.id, total, "Marketplace order", MARKETPLACE, external_order_id)
+    except InsufficientFunds:
+        db.session.rollback()
         flash("Insufficient wallet balance. Top up to continue.", "danger")
         return redirect(url_for("main.wallet"))
 
-    # create order and transfer funds
+    # create order
     order = MarketplaceOrder(user_id=current_user.id, total=total, status="paid")
-    current_user.wallet_balance = user_balance - total
-
-    # (simulate) create external_order_id
-    order.external_order_id = f"SIM-{secrets.token_urlsafe(6)}"
+    order.external_order_id = external_order_id
     db.session.add(order)
 
-    # remove cart items
-    for it in items:
-        db.session.delete(it)
+    # remove the cart items that were priced above (anything added since stays)
+    CartItem.query.filter(
+        CartItem.user_id == current_user.id, CartItem.id <= max_id
+    ).delete(synchronize_session=False)
 
+    stats.bump(orders=1)
     db.session.commit()
     flash("Order placed successfully", "success")
     return redirect(url_for("main.marketplace_order", oid=order.id))
@@ -577,10 +869,64 @@ def admin_create_product():
         title = request.form.get("title")
         price = float(request.form.get("price", 0))
         desc = request.form.get("description")
+        category = request.form.get("category") or None
         img = request.form.get("image")  # just a filename for prototype
-        p = Product(title=title, price=price, description=desc, image=img, in_stock=True)
+        try:
+            upload = _read_image_upload()
+        except InvalidImage as e:
+            flash(f"Image rejected: {e}", "danger")
+            return redirect(url_for("main.admin_create_product"))
+
+        # search indexes follow via DB triggers / generated column (see app/search.py)
+        p = Product(title=title, price=price, description=desc, category=category, image=img, in_stock=True)
+        if upload:
+            product_images.start(p)
         db.session.add(p)
         db.session.commit()
+        if upload:
+            product_images.submit(current_app._get_current_object(), p.id, upload)
         flash("Product created", "success")
         return redirect(url_for("main.admin_products"))
-    return render_flexible_template("admin/create_product.html")
\ No newline at end of file
+    return render_flexible_template("admin/create_product.html")
+
+@bp.route("/admin/marketplace/product/<int:pid>/image", methods=["POST"])
+@admin_required
+def admin_product_image(pid):
+    p = Product.query.get_or_404(pid)
+    try:
+        upload = _read_image_upload()
+    except InvalidImage as e:
+        flash(f"Image rejected: {e}", "danger")
+        return redirect(url_for("main.admin_products"))
+    if not upload:
+        flash("No image uploaded", "danger")
+        return redirect(url_for("main.admin_products"))
+
+    # an upload is a good moment to give up on any that never finished
+    product_images.expire_stale()
+    product_images.start(p)
+    db.session.commit()
+    # variants are rendered off-request; the product keeps its old images until they're ready
+    product_images.submit(current_app._get_current_object(), p.id, upload)
+    flash("Image uploaded, variants are being generated", "success")
+    return redirect(url_for("main.admin_products"))
+
+def _read_image_upload():
+    """Bytes of the image_file upload (None if there isn't one); raises InvalidImage."""
+    file = request.files.get("image_file")
+    if not file or not file.filename:
+        return None
+    max_bytes = current_app.config["PRODUCT_IMAGE_MAX_BYTES"]
+    data = file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise InvalidImage(f"larger than {max_bytes // (1024 * 1024)}MB")
+    probe(data)
+    return data
+
+@bp.route("/media/products/<path:filename>")
+def product_image(filename):
+    # content-addressed: a name never changes meaning, so cache it forever
+    resp = send_from_directory(current_app.config["PRODUCT_IMAGE_DIR"], filename, max_age=31536000)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
\ No newline at end of file
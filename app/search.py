@@ -0,0 +1,133 @@
+# app/search.py
+import re
+
+from sqlalchemy import inspect, text
+
+from . import db
+from .models import Product
+
+SEARCH_PAGE_SIZE = 24
+
+PRODUCT_CATEGORIES = [
+    "Fashion", "Electronics", "Home", "Beauty",
+    "Kids", "Fitness", "Groceries", "Tech Accessories"
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# which full-text backend each engine has, decided on first search
+_backends = {}
+
+
+def _backend():
+    engine = db.engine
+    backend = _backends.get(engine)
+    if backend is None:
+        dialect = engine.dialect.name
+        if dialect == "postgresql":
+            columns = {c["name"] for c in inspect(engine).get_columns("products")}
+            backend = "postgresql" if "search_vector" in columns else "like"
+        elif dialect == "sqlite" and inspect(engine).has_table("products_fts"):
+            backend = "sqlite"
+        else:
+            # e.g. a db.create_all() dev database without the search migration
+            backend = "like"
+        _backends[engine] = backend
+    return backend
+
+
+def _fts5_query(terms):
+    # quote every term so user input can't inject FTS5 syntax; prefix-match the last
+    quoted = ['"%s"' % t.replace('"', '""') for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search_products(q, category=None, after=None, limit=SEARCH_PAGE_SIZE):
+    """Ranked in-stock products matching q; returns (products, next_cursor_values).
+
+    `after` is the (score, id) pair of the last row on the previous page.
+    Without a query this is a plain category browse ordered by newest id.
+    """
+    terms = _TOKEN_RE.findall(q or "")
+    if not terms:
+        return _browse(category, after, limit)
+
+    backend = _backend()
+    params = {"category": category, "limit": limit + 1}
+    keyset = ""
+    if after:
+        params["after_score"], params["after_id"] = after
+        keyset = "AND (score < :after_score OR (score = :after_score AND id > :after_id))"
+
+    if backend == "postgresql":
+        params["q"] = " ".join(terms)
+        sql = f"""
+            SELECT id, score FROM (
+                SELECT p.id, ts_rank(p.search_vector, query) AS score
+                FROM products p, plainto_tsquery('simple', :q) query
+                WHERE p.search_vector @@ query
+                  AND p.in_stock
+                  AND (CAST(:category AS VARCHAR) IS NULL OR p.category = :category)
+            ) ranked
+            WHERE TRUE {keyset}
+            ORDER BY score DESC, id
+            LIMIT :limit
+        """
+    elif backend == "sqlite":
+        params["q"] = _fts5_query(terms)
+        sql = f"""
+            SELECT id, score FROM (
+                SELECT p.id AS id, -bm25(products_fts, 2.0, 1.0) AS score
+                FROM products_fts JOIN products p ON p.id = products_fts.rowid
+                WHERE products_fts MATCH :q
+                  AND p.in_stock = 1
+                  AND (:category IS NULL OR p.category = :category)
+            )
+            WHERE 1 = 1 {keyset}
+            ORDER BY score DESC, id
+            LIMIT :limit
+        """
+    else:
+        return _like_search(terms, category, after, limit)
+
+    rows = db.session.execute(text(sql), params).all()
+    return _page(rows, limit)
+
+
+def _like_search(terms, category, after, limit):
+    # unindexed fallback, only used when the search migration hasn't run
+    query = _base_query(category)
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.filter(Product.title.ilike(pattern) | Product.description.ilike(pattern))
+    if after:
+        query = query.filter(Product.id > after[1])
+    rows = [(pid, 0.0) for (pid,) in query.order_by(Product.id).limit(limit + 1)]
+    return _page(rows, limit)
+
+
+def _browse(category, after, limit):
+    query = _base_query(category)
+    if after:
+        query = query.filter(Product.id < after[1])
+    rows = [(pid, 0.0) for (pid,) in query.order_by(Product.id.desc()).limit(limit + 1)]
+    return _page(rows, limit)
+
+
+def _base_query(category):
+    query = db.session.query(Product.id).filter(Product.in_stock.is_(True))
+    if category:
+        query = query.filter(Product.category == category)
+    return query
+
+
+def _page(rows, limit):
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (float(rows[-1][1]), rows[-1][0])
+
+    ids = [row[0] for row in rows]
+    by_id = {p.id: p for p in Product.query.filter(Product.id.in_(ids))} if ids else {}
+    return [by_id[i] for i in ids if i in by_id], next_after
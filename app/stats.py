@@ -0,0 +1,125 @@
+# app/stats.py
+import logging
+import random
+
+from sqlalchemy import event, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import (
+    PlatformStat, User, Voucher, MerchantPayment, MarketplaceOrder
+)
+
+USERS = "users"
+VOUCHERS = "vouchers"
+VOUCHERS_REDEEMED = "vouchers_redeemed"
+PAYMENTS = "payments"
+PAYMENTS_PAID = "payments_paid"
+ORDERS = "orders"
+WALLET_BALANCE = "wallet_balance"
+
+ALL_STATS = (
+    USERS, VOUCHERS, VOUCHERS_REDEEMED, PAYMENTS,
+    PAYMENTS_PAID, ORDERS, WALLET_BALANCE,
+)
+
+# each counter is spread over rows "<name>#<n>" so concurrent bumps rarely
+# touch the same row; readers sum them (rebuild writes plain "<name>")
+SHARDS = 16
+
+# deltas waiting for the current transaction to commit
+_PENDING = "stats_pending"
+
+log = logging.getLogger("app.stats")
+
+
+def bump(**deltas):
+    """Add deltas to the named counters once the caller's transaction commits.
+
+    Nothing is written inside the caller's transaction, so money writes never
+    queue on a counter row: the summed deltas go to one random shard per
+    counter in a short transaction of their own after the commit, and are
+    dropped on rollback. A crash in between loses them; `flask stats rebuild`
+    recounts from the source tables.
+    """
+    pending = db.session.info.setdefault(_PENDING, {})
+    for name, delta in deltas.items():
+        if delta:
+            pending[name] = pending.get(name, 0) + delta
+
+
+def _upsert(dialect_name, name, delta):
+    """INSERT ... ON CONFLICT adding delta to one counter row."""
+    table = PlatformStat.__table__
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    stmt = dialect.insert(table).values(name=name, value=delta)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={"value": table.c.value + stmt.excluded.value},
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _write_pending(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    try:
+        with session.get_bind().connect() as conn:
+            for name, delta in pending.items():
+                if delta:
+                    conn.execute(_upsert(conn.dialect.name, f"{name}#{random.randrange(SHARDS)}", delta))
+            conn.commit()
+    except Exception:
+        log.exception("could not write platform stats %r", pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+def get_stats():
+    """All counters in one small query, missing ones reported as 0."""
+    stats = dict.fromkeys(ALL_STATS, 0)
+    for name, value in db.session.query(PlatformStat.name, PlatformStat.value):
+        name = name.split("#", 1)[0]
+        stats[name] = stats.get(name, 0) + value
+    return stats
+
+
+def compute_stats():
+    """Recompute every counter from the source tables (slow, full scans)."""
+    return {
+        USERS: db.session.query(func.count(User.id)).scalar(),
+        VOUCHERS: db.session.query(func.count(Voucher.id)).scalar(),
+        VOUCHERS_REDEEMED: db.session.query(func.count(Voucher.id))
+            .filter(Voucher.status == "redeemed").scalar(),
+        PAYMENTS: db.session.query(func.count(MerchantPayment.id)).scalar(),
+        PAYMENTS_PAID: db.session.query(func.count(MerchantPayment.id))
+            .filter(MerchantPayment.status == "paid").scalar(),
+        ORDERS: db.session.query(func.count(MarketplaceOrder.id)).scalar(),
+        WALLET_BALANCE: db.session.query(
+            func.coalesce(func.sum(User.wallet_balance), 0)
+        ).scalar(),
+    }
+
+
+def rebuild_stats():
+    """Replace the stored counters with freshly computed values.
+
+    Writes that land between the recount and the commit are not reflected,
+    so run it when traffic is quiet.
+    """
+    fresh = compute_stats()
+    try:
+        PlatformStat.query.delete()
+        db.session.add_all(
+            PlatformStat(name=name, value=value or 0) for name, value in fresh.items()
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return fresh
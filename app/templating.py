@@ -0,0 +1,106 @@
+# app/templating.py
+import ast
+import os
+import threading
+
+from jinja2 import FileSystemBytecodeCache
+
+RENDER_FUNCS = {"render_template", "render_flexible_template"}
+
+
+def collect_template_calls(package_dir):
+    """Find render calls with literal template names in the app's modules.
+
+    Returns a list of (primary, alt, "file:line") for every
+    render_template / render_flexible_template call.
+    """
+    calls = []
+    for name in sorted(os.listdir(package_dir)):
+        if not name.endswith(".py"):
+            continue
+        path = os.path.join(package_dir, name)
+        with open(path, encoding="utf-8") as fh:
+            tree = ast.parse(fh.read(), filename=path)
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call) or not node.args:
+                continue
+            func = node.func
+            fname = func.id if isinstance(func, ast.Name) else getattr(func, "attr", None)
+            if fname not in RENDER_FUNCS:
+                continue
+            primary = node.args[0]
+            if not isinstance(primary, ast.Constant) or not isinstance(primary.value, str):
+                continue
+            alt = None
+            for kw in node.keywords:
+                if kw.arg == "alt" and isinstance(kw.value, ast.Constant):
+                    alt = kw.value.value
+            calls.append((primary.value, alt, f"{name}:{node.lineno}"))
+    return calls
+
+
+class TemplateResolver:
+    """Maps (primary, alt) to the template name that actually exists.
+
+    The table is filled once at startup from the templates Jinja can see,
+    so requests never pay for a failed loader lookup + TemplateNotFound.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.available = frozenset()
+        self.resolved = {}
+        self.unresolved = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault(
+            "JINJA_BYTECODE_CACHE_DIR", os.path.join(app.instance_path, "jinja_cache")
+        )
+        cache_dir = app.config["JINJA_BYTECODE_CACHE_DIR"]
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+        self.refresh()
+        self.report(collect_template_calls(app.root_path))
+        app.extensions["template_resolver"] = self
+
+    def refresh(self):
+        with self._lock:
+            self.available = frozenset(self.app.jinja_env.list_templates())
+            self.resolved = {}
+
+    def resolve(self, primary, alt=None):
+        key = (primary, alt)
+        name = self.resolved.get(key)
+        if name is not None and not self.app.debug:
+            return name
+
+        if self.app.debug:
+            # templates may appear while the dev server is running
+            self.refresh()
+        if primary in self.available or not alt or alt not in self.available:
+            # primary missing with no usable alt: let render_template raise as before
+            name = primary
+        else:
+            name = alt
+        with self._lock:
+            self.resolved[key] = name
+        return name
+
+    def report(self, calls):
+        """Resolve every known call up front and log the ones with no template."""
+        self.unresolved = []
+        for primary, alt, where in calls:
+            name = self.resolve(primary, alt)
+            if name not in self.available:
+                self.unresolved.append((primary, alt, where))
+
+        for primary, alt, where in self.unresolved:
+            tried = f"{primary} / {alt}" if alt else primary
+            self.app.logger.warning("Unresolved template %s (%s)", tried, where)
+
+
+template_resolver = TemplateResolver()
@@ -1,9 +1,9 @@
-
 from flask import Blueprint, render_template, request, redirect, flash, url_for
 from flask_login import login_required, current_user
 from . import db
-from .models import UtilityPurchase
-import datetime
+from .wallet import debit, InsufficientFunds, utility_category
+from .idempotency import idempotent
+from .fulfilment import enqueue
 
 utility = Blueprint("utility", __name__, url_prefix="/utility")
 
@@ -22,75 +22,30 @@ def utility_form(category):
 # PROCESS PURCHASE
 @utility.route("/buy/<string:category>", methods=["POST"])
 @login_required
+@idempotent
 def utility_buy(category):
-    amount = float(request.form.get("amount"))
+    try:
+        amount = float(request.form.get("amount"))
+    except (TypeError, ValueError):
+        amount = 0
     details = request.form.get("details")
 
-    if current_user.wallet_balance < amount:
-        flash("Insufficient balance", "danger")
+    if amount <= 0:
+        flash("Invalid amount", "danger")
         return redirect(url_for("utility.utility_form", category=category))
 
     # Deduct
-    current_user.wallet_balance -= amount
-
-    tx = UtilityPurchase(
-        user_id=current_user.id,
-        category=category,
-        amount=amount,
-        details=details,
-        created_at=datetime.utcnow()
-    )
-
-    db.session.add(tx)
-    db.session.commit()
-
-    flash("Utility purchase successful!", "success")
-
-from flask import Blueprint, render_template, request, redirect, flash, url_for
-from flask_login import login_required, current_user
-from . import db
-from .models import UtilityPurchase
-import datetime
-
-utility = Blueprint("utility", __name__, url_prefix="/utility")
-
-# UTILITIES HOME
-@utility.route("/")
-@login_required
-def utility_home():
-    return render_template("utility/home.html")
-
-# SHOW FORM
-@utility.route("/<string:category>")
-@login_required
-def utility_form(category):
-    return render_template("utility/form.html", category=category)
-
-# PROCESS PURCHASE
-@utility.route("/buy/<string:category>", methods=["POST"])
-@login_required
-def utility_buy(category):
-    amount = float(request.form.get("amount"))
-    details = request.form.get("details")
-
-    if current_user.wallet_balance < amount:
+    try:
+        debit(current_user.id, amount, f"Utility ({category})", utility_category(category), category)
+    except InsufficientFunds:
+        db.session.rollback()
         flash("Insufficient balance", "danger")
         return redirect(url_for("utility.utility_form", category=category))
 
-    # Deduct
-    current_user.wallet_balance -= amount
-
-    tx = UtilityPurchase(
-        user_id=current_user.id,
-        category=category,
-        amount=amount,
-        details=details,
-        created_at=datetime.utcnow()
-    )
-
-    db.session.add(tx)
+    # fulfilled by the worker (app/fulfilment.py); refunded if the provider fails
+    enqueue(current_user.id, category, amount, details)
     db.session.commit()
 
-    flash("Utility purchase successful!", "success")
+    flash("Utility purchase submitted!", "success")
 
     return redirect(url_for("main.wallet"))
\ No newline at end of file
@@ -0,0 +1,220 @@
+# app/wallet.py
+import datetime
+import re
+
+from sqlalchemy import literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db, stats
+from .models import DailySpend, User, WalletTransaction
+
+# WalletTransaction.category values
+MOBILE = "mobile"
+ELECTRICITY = "electricity"
+DIGITAL_VOUCHERS = "vouchers"
+LOTTO = "lotto"
+UTILITY = "utility"
+MERCHANT_PAYMENT = "merchant_payment"
+MARKETPLACE = "marketplace"
+MERCHANT_INCOME = "merchant_income"
+VOUCHER_REDEEMED = "voucher_redeemed"
+OTHER = "other"
+
+# money going out in these categories is rolled up into daily_spend;
+# a credit in one of them (a refund) takes it back off
+SPEND_CATEGORIES = frozenset(
+    (MOBILE, ELECTRICITY, DIGITAL_VOUCHERS, LOTTO, UTILITY, MERCHANT_PAYMENT, MARKETPLACE)
+)
+
+CATEGORY_LABELS = {
+    MOBILE: "Airtime & data",
+    ELECTRICITY: "Electricity",
+    DIGITAL_VOUCHERS: "Digital vouchers",
+    LOTTO: "Lotto",
+    UTILITY: "Other utilities",
+    MERCHANT_PAYMENT: "Merchant payments",
+    MARKETPLACE: "Marketplace",
+    MERCHANT_INCOME: "Merchant income",
+    VOUCHER_REDEEMED: "Vouchers redeemed",
+    OTHER: "Other",
+}
+
+
+def utility_category(name):
+    """Ledger category for a UtilityPurchase.category."""
+    return name if name in (MOBILE, ELECTRICITY, DIGITAL_VOUCHERS, LOTTO) else UTILITY
+
+
+# the free-text `type` strings writers produce, for rows that predate the columns
+_TYPE_PATTERNS = (
+    (re.compile(r"^Mobile \((.*)\)$"), MOBILE),
+    (re.compile(r"^Electricity \(Meter (.*)\)$"), ELECTRICITY),
+    (re.compile(r"^Digital Voucher \((.*)\)$"), DIGITAL_VOUCHERS),
+    (re.compile(r"^Lotto \((.*)\)$"), LOTTO),
+    (re.compile(r"^Utility \((.*)\)$"), UTILITY),
+    (re.compile(r"^Merchant payment \((.*)\)$"), MERCHANT_PAYMENT),
+    (re.compile(r"^Voucher redeemed \((.*)\)$"), VOUCHER_REDEEMED),
+    (re.compile(r"^Marketplace order$"), MARKETPLACE),
+    (re.compile(r"^Refund: (.*) purchase failed$"), None),
+)
+
+
+def categorize(tx_type, amount):
+    """(category, reference) parsed from a ledger row's type text."""
+    for pattern, category in _TYPE_PATTERNS:
+        match = pattern.match(tx_type or "")
+        if match is None:
+            continue
+        reference = match.group(1)[:100] if match.groups() else None
+        if category is None:
+            # a refund credits the purchase's own category, taking the spend back
+            return utility_category(reference), None
+        if category == UTILITY:
+            return utility_category(reference), reference
+        if category == MERCHANT_PAYMENT and (amount or 0) > 0:
+            return MERCHANT_INCOME, reference
+        return category, reference
+    return OTHER, None
+
+
+class InsufficientFunds(Exception):
+    """The wallet balance is lower than the amount being debited."""
+
+
+def _apply(user_id, delta, tx_type, require_funds, category, reference, spend_day=None):
+    """Move a user's balance by delta and log it; returns the new balance.
+
+    The balance change is a single conditional UPDATE ... RETURNING, so two
+    concurrent spends can never both pass the balance check. On Postgres the
+    ledger insert rides along in the same statement as a data-modifying CTE.
+    Spend categories also bump the daily_spend rollup, on spend_day if given
+    (a refund belongs to the day of the purchase it undoes), else today.
+    Nothing is committed here -- callers commit with the rest of their writes.
+    """
+    users = User.__table__
+    ledger = WalletTransaction.__table__
+    now = datetime.datetime.utcnow()
+    if reference is not None:
+        reference = str(reference)[:100]
+
+    upd = (
+        users.update()
+        .where(users.c.id == user_id)
+        .values(wallet_balance=users.c.wallet_balance + delta)
+    )
+    if require_funds:
+        upd = upd.where(users.c.wallet_balance >= -delta)
+    upd = upd.returning(users.c.id, users.c.wallet_balance)
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        changed = upd.cte("changed")
+        logged = ledger.insert().from_select(
+            ["user_id", "type", "category", "reference", "amount", "created_at"],
+            select(
+                changed.c.id,
+                literal(tx_type, ledger.c.type.type),
+                literal(category, ledger.c.category.type),
+                literal(reference, ledger.c.reference.type),
+                literal(delta, ledger.c.amount.type),
+                literal(now, ledger.c.created_at.type),
+            ),
+        ).cte("logged")
+        row = db.session.execute(
+            select(changed.c.wallet_balance).add_cte(logged)
+        ).first()
+    else:
+        row = db.session.execute(upd).first()
+        if row is not None:
+            db.session.execute(
+                ledger.insert().values(
+                    user_id=user_id, type=tx_type, category=category,
+                    reference=reference, amount=delta, created_at=now
+                )
+            )
+
+    if row is None:
+        if require_funds:
+            raise InsufficientFunds(user_id)
+        raise LookupError(f"user {user_id} not found")
+
+    if category in SPEND_CATEGORIES:
+        _bump_daily_spend(user_id, spend_day or now.date(), category, -delta)
+    return row[-1]
+
+
+def _bump_daily_spend(user_id, day, category, spent):
+    """Add to the (user, day, category) rollup in the caller's transaction."""
+    db.session.execute(
+        daily_spend_upsert(db.session.get_bind().dialect.name, user_id, day, category, spent)
+    )
+
+
+def daily_spend_upsert(dialect_name, user_id, day, category, spent, tx_count=None):
+    """INSERT ... ON CONFLICT adding spent (and tx_count spends, by default
+    one if spent is positive) to one rollup row.
+
+    An upsert, so two first spends of the day can't race on the insert.
+    """
+    table = DailySpend.__table__
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    if tx_count is None:
+        tx_count = 1 if spent > 0 else 0
+    stmt = dialect.insert(table).values(
+        user_id=user_id, day=day, category=category,
+        amount=spent, tx_count=tx_count,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.day, table.c.category],
+        set_={
+            "amount": table.c.amount + stmt.excluded.amount,
+            "tx_count": table.c.tx_count + stmt.excluded.tx_count,
+        },
+    )
+
+
+def _check_amount(amount):
+    if not amount > 0:
+        raise ValueError(f"amount must be positive, got {amount!r}")
+
+
+def _debit(user_id, amount, tx_type, category, reference):
+    _check_amount(amount)
+    return _apply(user_id, -amount, tx_type, require_funds=True, category=category, reference=reference)
+
+
+def _credit(user_id, amount, tx_type, category, reference, spend_day=None):
+    _check_amount(amount)
+    return _apply(
+        user_id, amount, tx_type, require_funds=False, category=category, reference=reference,
+        spend_day=spend_day,
+    )
+
+
+def debit(user_id, amount, tx_type, category=OTHER, reference=None):
+    """Take amount from the wallet or raise InsufficientFunds."""
+    balance = _debit(user_id, amount, tx_type, category, reference)
+    stats.bump(wallet_balance=-amount)
+    return balance
+
+
+def credit(user_id, amount, tx_type, category=OTHER, reference=None, spend_day=None):
+    """Add amount to the wallet; a refund passes the purchase's date as spend_day."""
+    balance = _credit(user_id, amount, tx_type, category, reference, spend_day)
+    stats.bump(wallet_balance=amount)
+    return balance
+
+
+def transfer(from_id, to_id, amount, tx_type, category=OTHER, reference=None, payee_category=OTHER):
+    """Move amount between wallets; returns the payer's new balance.
+
+    Rows are touched in id order so opposing transfers can't deadlock.
+    If the debit fails the caller's rollback also undoes an earlier credit.
+    The platform's total balance doesn't change, so no stats are bumped.
+    """
+    if from_id < to_id:
+        balance = _debit(from_id, amount, tx_type, category, reference)
+        _credit(to_id, amount, tx_type, payee_category, reference)
+    else:
+        _credit(to_id, amount, tx_type, payee_category, reference)
+        balance = _debit(from_id, amount, tx_type, category, reference)
+    return balance
@@ -0,0 +1,281 @@
+# benchmarks/run.py
+"""Load and latency benchmarks for the money paths.
+
+Seeds a throwaway SQLite (or local Postgres, via --database-url and --drop) database,
+then drives the real app through the Flask test client from several
+processes at once. Reports throughput, p50/p95/p99 latency and SQL queries
+per request for each scenario.
+
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+--compare exits non-zero if any scenario regressed past --threshold.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from app import create_app, db
+
+
+# ---------------------------------------------------------
+# SCENARIOS
+# Each takes (client, user, i) and returns the timed response.
+# Anything done before the timed request goes in the matching "prepare".
+# ---------------------------------------------------------
+
+def _login(client, user, i):
+    return client.post("/login", data={"phone": user["phone"], "password": user["password"]})
+
+
+def _transactions(client, user, i):
+    return client.get("/transactions")
+
+
+def _pay_merchant(client, user, i):
+    return client.post(f"/merchant/pay/{user['payment_codes'][i]}")
+
+
+def _redeem_voucher(client, user, i):
+    return client.post(f"/redeem/{user['vouchers'][i]}")
+
+
+def _prepare_checkout(client, user, i):
+    pid = user["product_ids"][i % len(user["product_ids"])]
+    client.post("/marketplace/cart/add", data={"product_id": pid, "qty": 1})
+
+
+def _checkout(client, user, i):
+    return client.post("/marketplace/checkout")
+
+
+def _qr_payment(client, user, i):
+    return client.get(f"/merchant/payment/{user['payment_code']}/qrcode")
+
+
+def _qr_payment_svg(client, user, i):
+    return client.get(f"/merchant/payment/{user['payment_code']}/qrcode?format=svg")
+
+
+def _prepare_qr_revalidate(client, user, i):
+    if "etag" not in user:
+        user["etag"] = client.get(f"/voucher/{user['vouchers'][0]}/qrcode").headers["ETag"]
+
+
+def _qr_revalidate(client, user, i):
+    return client.get(
+        f"/voucher/{user['vouchers'][0]}/qrcode",
+        headers={"If-None-Match": user["etag"]}
+    )
+
+
+# name -> (timed call, untimed prepare, needs a logged-in session, ok statuses)
+SCENARIOS = {
+    "login": (_login, None, False, (302,)),
+    "transactions": (_transactions, None, True, (200,)),
+    "pay_merchant": (_pay_merchant, None, True, (302,)),
+    "redeem_voucher": (_redeem_voucher, None, True, (302,)),
+    "marketplace_checkout": (_checkout, _prepare_checkout, True, (302,)),
+    "qr_payment": (_qr_payment, None, False, (200,)),
+    "qr_payment_svg": (_qr_payment_svg, None, False, (200,)),
+    "qr_revalidate": (_qr_revalidate, _prepare_qr_revalidate, False, (304,)),
+}
+
+
+# ---------------------------------------------------------
+# WORKERS
+# ---------------------------------------------------------
+
+def _make_app(db_url, instance_dir):
+    return create_app({
+        "SQLALCHEMY_DATABASE_URI": db_url,
+        "QR_CACHE_DIR": os.path.join(instance_dir, "qr_cache"),
+        "JINJA_BYTECODE_CACHE_DIR": os.path.join(instance_dir, "jinja_cache"),
+        "TESTING": True,
+        # every worker logs in from 127.0.0.1; measure the KDF, not the throttle
+        "AUTH_ATTEMPTS_PER_IP": 10 ** 9,
+    })
+
+
+def _run_worker(job):
+    name, db_url, instance_dir, uid, user, iterations = job
+    call, prepare, needs_login, ok_statuses = SCENARIOS[name]
+
+    app = _make_app(db_url, instance_dir)
+    queries = [0]
+    with app.app_context():
+        event.listen(
+            db.engine, "before_cursor_execute",
+            lambda *args, **kwargs: queries.__setitem__(0, queries[0] + 1)
+        )
+
+    client = app.test_client()
+    if needs_login:
+        with client.session_transaction() as sess:
+            sess["_user_id"] = uid
+            sess["_fresh"] = True
+
+    latencies, query_counts, errors = [], [], 0
+    began = time.time()
+    for i in range(iterations):
+        if prepare:
+            prepare(client, user, i)
+        before = queries[0]
+        start = time.perf_counter()
+        try:
+            resp = call(client, user, i)
+            ok = resp.status_code in ok_statuses
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - start)
+        query_counts.append(queries[0] - before)
+        errors += not ok
+
+    return latencies, query_counts, errors, began, time.time()
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_scenario(pool, name, manifest, db_url, instance_dir, iterations):
+    jobs = []
+    for uid, user in manifest["users"].items():
+        user = dict(user, password=manifest["password"], product_ids=manifest["product_ids"])
+        jobs.append((name, db_url, instance_dir, uid, user, iterations))
+
+    results = pool.map(_run_worker, jobs)
+    # wall clock of the request loops only, not app startup in the workers
+    wall = max(r[4] for r in results) - min(r[3] for r in results)
+
+    latencies = sorted(l for r in results for l in r[0])
+    queries = [q for r in results for q in r[1]]
+    errors = sum(r[2] for r in results)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "queries_per_request": round(statistics.fmean(queries), 2) if queries else 0.0,
+    }
+
+
+# ---------------------------------------------------------
+# REPORTING
+# ---------------------------------------------------------
+
+def compare(results, baseline, threshold):
+    """List human-readable regressions of results against a baseline file."""
+    problems = []
+    for name, cur in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if cur["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            problems.append(f"{name}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+        if cur["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            problems.append(f"{name}: throughput {base['throughput_rps']} -> {cur['throughput_rps']} req/s")
+        # query counts are deterministic, so any increase is an N+1 suspect
+        if cur["queries_per_request"] > base["queries_per_request"] + 0.5:
+            problems.append(
+                f"{name}: queries/request {base['queries_per_request']} -> {cur['queries_per_request']}"
+            )
+        if cur["errors"] > base["errors"]:
+            problems.append(f"{name}: errors {base['errors']} -> {cur['errors']}")
+    return problems
+
+
+def print_table(results):
+    header = f"{'scenario':<22}{'reqs':>7}{'err':>5}{'req/s':>10}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'q/req':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results["scenarios"].items():
+        print(
+            f"{name:<22}{r['requests']:>7}{r['errors']:>5}{r['throughput_rps']:>10.1f}"
+            f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['queries_per_request']:>7.1f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4, help="concurrent worker processes")
+    parser.add_argument("--iterations", type=int, default=100, help="requests per process per scenario")
+    parser.add_argument("--history", type=int, default=5000, help="seeded wallet transactions per user")
+    parser.add_argument("--database-url", help="database to seed and use (default: temp SQLite file)")
+    parser.add_argument("--drop", action="store_true",
+                        help="allow dropping every table of a non-SQLite --database-url")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="run only these")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="flag regressions against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown (default 0.25)")
+    args = parser.parse_args(argv)
+    if args.database_url and not args.database_url.startswith("sqlite") and not args.drop:
+        parser.error("seeding drops every table; pass --drop to use a non-SQLite --database-url")
+
+    workdir = tempfile.mkdtemp(prefix="senti-bench-")
+    db_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from benchmarks.seed import seed
+    app = _make_app(db_url, workdir)
+    with app.app_context():
+        manifest = seed(args.processes, args.iterations, args.history, drop=args.drop)
+        db.engine.dispose()
+
+    names = args.scenario or list(SCENARIOS)
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": db_url.split(":", 1)[0],
+            "processes": args.processes,
+            "iterations": args.iterations,
+            "history": args.history,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "scenarios": {},
+    }
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.processes) as pool:
+        for name in names:
+            results["scenarios"][name] = run_scenario(
+                pool, name, manifest, db_url, workdir, args.iterations
+            )
+
+    print_table(results)
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        problems = compare(results, baseline, args.threshold)
+        if problems:
+            print("\nRegressions:")
+            for p in problems:
+                print(f"  {p}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
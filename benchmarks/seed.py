@@ -0,0 +1,103 @@
+# benchmarks/seed.py
+"""Seed a throwaway database with enough data for the benchmark scenarios."""
+import datetime
+import secrets
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import (
+    User, WalletTransaction, MerchantPayment, Voucher, Product, Store
+)
+
+PASSWORD = "bench-pass"
+
+
+def _insert(model, rows, chunk=1000):
+    table = model.__table__
+    for i in range(0, len(rows), chunk):
+        db.session.execute(table.insert(), rows[i:i + chunk])
+
+
+def seed(workers, iterations, history, drop=False):
+    """Create one payer per worker plus merchants, vouchers and products.
+
+    Every table is dropped first, so anything but SQLite needs drop=True.
+    Returns a JSON-able manifest the worker processes use to pick their data.
+    """
+    if db.engine.dialect.name != "sqlite" and not drop:
+        raise RuntimeError(
+            f"refusing to drop all tables on a {db.engine.dialect.name} database without drop=True"
+        )
+    db.drop_all()
+    db.create_all()
+
+    now = datetime.datetime.utcnow()
+    pw_hash = generate_password_hash(PASSWORD)  # hash once, share across users
+
+    _insert(User, [
+        {
+            "id": i, "phone": f"0800{i:06d}", "password": pw_hash,
+            "wallet_balance": 10_000_000.0, "is_admin": False, "created_at": now,
+        }
+        for i in range(1, 2 * workers + 1)
+    ])
+    payers = list(range(1, workers + 1))
+    merchants = list(range(workers + 1, 2 * workers + 1))
+
+    # heavy histories so /transactions pages over a realistic table
+    _insert(WalletTransaction, [
+        {
+            "user_id": uid, "type": "Mobile (MTN)", "category": "mobile", "reference": "MTN",
+            "amount": -10.0,
+            "created_at": now - datetime.timedelta(minutes=n),
+        }
+        for uid in payers for n in range(history)
+    ])
+
+    # a payment can only be paid once, so one pending request per iteration
+    payment_codes = {uid: [secrets.token_urlsafe(8) for _ in range(iterations)] for uid in payers}
+    _insert(MerchantPayment, [
+        {
+            "merchant_id": merchant, "amount": 1.0, "description": "bench",
+            "code": code, "status": "pending", "created_at": now,
+        }
+        for uid, merchant in zip(payers, merchants) for code in payment_codes[uid]
+    ])
+
+    voucher_codes = {uid: [secrets.token_urlsafe(6) for _ in range(iterations)] for uid in payers}
+    _insert(Voucher, [
+        {
+            "creator_id": merchants[0], "amount": 1.0, "code": code,
+            "status": "active", "created_at": now,
+        }
+        for codes in voucher_codes.values() for code in codes
+    ])
+
+    db.session.add(Store(id=1, name="Bench Store"))
+    _insert(Product, [
+        {
+            "id": pid, "store_id": 1, "title": f"Bench product {pid}",
+            "description": "benchmark item", "price": 1.0,
+            "in_stock": True, "created_at": now,
+        }
+        for pid in range(1, 51)
+    ])
+    db.session.commit()
+
+    from app.stats import rebuild_stats
+    rebuild_stats()
+
+    return {
+        "password": PASSWORD,
+        "users": {
+            str(uid): {
+                "phone": f"0800{uid:06d}",
+                "payment_code": payment_codes[uid][0],
+                "payment_codes": payment_codes[uid],
+                "vouchers": voucher_codes[uid],
+            }
+            for uid in payers
+        },
+        "product_ids": list(range(1, 51)),
+    }
@@ -0,0 +1,121 @@
+# gunicorn.conf.py
+"""Production gunicorn settings (picked up by `gunicorn -c gunicorn.conf.py wsgi:app`).
+
+The app is imported once in the master (preload) and forked into workers,
+so Flask, SQLAlchemy, qrcode and Pillow are only imported once and their
+pages are shared copy-on-write. Every knob can be overridden from the
+environment:
+
+    WEB_CONCURRENCY        worker processes (default: from cores and memory)
+    GUNICORN_THREADS       threads per worker (default 4; 1 = sync worker)
+    WORKER_MEMORY_MB       expected resident size of one worker (default 150)
+    GUNICORN_MAX_REQUESTS  recycle a worker after this many requests (default 1000)
+    GUNICORN_TIMEOUT       hard worker timeout in seconds (default 30)
+"""
+import gc
+import multiprocessing
+import os
+import time
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _memory_limit_mb():
+    """Container memory limit (cgroup v2, then v1), else physical RAM."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as fh:
+                raw = fh.read().strip()
+        except OSError:
+            continue
+        if raw.isdigit() and int(raw) < 1 << 60:  # v1 reports a huge number for "unlimited"
+            return int(raw) // (1024 * 1024)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _default_workers():
+    """2 x cores + 1, but never more than memory can hold."""
+    by_cpu = multiprocessing.cpu_count() * 2 + 1
+    memory = _memory_limit_mb()
+    if memory is None:
+        return by_cpu
+    # keep a quarter of the limit for the master, page cache and spikes
+    by_memory = int(memory * 0.75) // max(_env_int("WORKER_MEMORY_MB", 150), 1)
+    return max(1, min(by_cpu, by_memory))
+
+
+# ---------------------------------------------------------
+# SERVER
+# ---------------------------------------------------------
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+preload_app = True
+
+workers = _env_int("WEB_CONCURRENCY", 0) or _default_workers()
+threads = max(_env_int("GUNICORN_THREADS", 4), 1)
+# threads let I/O-bound routes (DB round trips, QR/file serving) overlap
+worker_class = "gthread" if threads > 1 else "sync"
+
+# the DB pool is sized from these (app/db_profiles.py), so publish what we chose
+# before wsgi.py is preloaded
+os.environ["WEB_CONCURRENCY"] = str(workers)
+os.environ["GUNICORN_THREADS"] = str(threads)
+
+# ---------------------------------------------------------
+# WORKER LIFECYCLE
+# ---------------------------------------------------------
+
+# recycle workers to bound slow leaks; jitter so they don't all restart at once
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = max(max_requests // 10, 1) if max_requests else 0
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+_started = time.perf_counter()
+
+
+def when_ready(server):
+    import wsgi
+
+    server.log.info(
+        "app preloaded in %.0fms; starting %d %s worker(s) x %d thread(s)",
+        wsgi.load_seconds * 1000, workers, worker_class, threads
+    )
+    # move everything imported so far out of the collector's view, so the
+    # children don't touch (and copy) those pages on their first gc pass
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import wsgi
+    from app.db_profiles import dispose_engines
+    from app.metrics import metrics
+
+    worker._forked_at = time.perf_counter()
+    # never share pooled DB sockets with the master or sibling workers
+    dispose_engines(wsgi.app)
+    # counters inherited from the master are not this worker's
+    metrics.reset()
+
+
+def post_worker_init(worker):
+    worker.log.info(
+        "worker %s booted in %.1fms (%.0fms since master start)",
+        worker.pid,
+        (time.perf_counter() - worker._forked_at) * 1000,
+        (time.perf_counter() - _started) * 1000,
+    )
@@ -51,6 +51,25 @@ def get_metadata():
     return target_db.metadata
 
 
+# schema objects created by hand in migrations (dialect-specific search and
+# lookup indexes) that the models don't describe; autogenerate must not
+# emit DROPs for them
+UNMODELLED_TABLE_PREFIXES = ("products_fts",)  # FTS5 table + its shadow tables
+UNMODELLED = {
+    ("column", "search_vector"),
+    ("index", "ix_products_search_vector"),
+    ("index", "ix_users_phone_pattern"),
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if not reflected or compare_to is not None:
+        return True
+    if type_ == "table" and name.startswith(UNMODELLED_TABLE_PREFIXES):
+        return False
+    return (type_, name) not in UNMODELLED
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +84,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +113,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
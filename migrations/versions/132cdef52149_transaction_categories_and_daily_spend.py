@@ -0,0 +1,134 @@
+"""add wallet transaction category/reference and the daily_spend rollup
+
+Revision ID: 132cdef52149
+Revises: 35a5af12e41e
+Create Date: 2026-10-17 23:45:41.344285
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '132cdef52149'
+down_revision = '35a5af12e41e'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+LEDGER_TABLES = ('wallet_transactions', 'wallet_transactions_archive')
+
+# frozen copy of the type strings the app has written; new rows carry
+# category/reference from app/wallet.py directly
+UTILITY_CATEGORIES = ('mobile', 'electricity', 'vouchers', 'lotto')
+SPEND_CATEGORIES = UTILITY_CATEGORIES + ('utility', 'merchant_payment', 'marketplace')
+PATTERNS = (
+    (re.compile(r'^Mobile \((.*)\)$'), 'mobile'),
+    (re.compile(r'^Electricity \(Meter (.*)\)$'), 'electricity'),
+    (re.compile(r'^Digital Voucher \((.*)\)$'), 'vouchers'),
+    (re.compile(r'^Lotto \((.*)\)$'), 'lotto'),
+    (re.compile(r'^Utility \((.*)\)$'), 'utility'),
+    (re.compile(r'^Merchant payment \((.*)\)$'), 'merchant_payment'),
+    (re.compile(r'^Voucher redeemed \((.*)\)$'), 'voucher_redeemed'),
+    (re.compile(r'^Marketplace order$'), 'marketplace'),
+    (re.compile(r'^Refund: (.*) purchase failed$'), 'refund'),
+)
+
+
+def categorize(tx_type, amount):
+    for pattern, category in PATTERNS:
+        match = pattern.match(tx_type or '')
+        if match is None:
+            continue
+        reference = match.group(1)[:100] if match.groups() else None
+        if category == 'utility':
+            category = reference if reference in UTILITY_CATEGORIES else 'utility'
+        elif category == 'refund':
+            # a refund credits the purchase's own category, taking the spend back
+            category, reference = (reference if reference in UTILITY_CATEGORIES else 'utility'), None
+        elif category == 'merchant_payment' and (amount or 0) > 0:
+            category = 'merchant_income'
+        return category, reference
+    return 'other', None
+
+
+def backfill_categories(bind, name):
+    """Parse `type` in id order, BATCH_SIZE rows per committed UPDATE."""
+    table = sa.table(
+        name, sa.column('id'), sa.column('type'), sa.column('amount'),
+        sa.column('category'), sa.column('reference'),
+    )
+    update = table.update().where(table.c.id == sa.bindparam('row_id')).values(
+        category=sa.bindparam('new_category'), reference=sa.bindparam('new_reference'),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(table.c.id, table.c.type, table.c.amount)
+            .where(table.c.id > last_id, table.c.category.is_(None))
+            .order_by(table.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        params = []
+        for row in rows:
+            category, reference = categorize(row.type, row.amount)
+            params.append({'row_id': row.id, 'new_category': category, 'new_reference': reference})
+        bind.execute(update, params)
+        last_id = rows[-1].id
+
+
+def upgrade():
+    op.create_table('daily_spend',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category', sa.String(length=30), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('tx_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'category')
+    )
+    for name in LEDGER_TABLES:
+        op.add_column(name, sa.Column('category', sa.String(length=30), nullable=True))
+        op.add_column(name, sa.Column('reference', sa.String(length=100), nullable=True))
+
+    # commit the DDL first so the ALTERs' locks are gone before the data pass,
+    # then let every batch commit on its own
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        for name in LEDGER_TABLES:
+            backfill_categories(bind, name)
+
+        ledger = sa.union_all(*(
+            sa.select(
+                sa.column('user_id'), sa.column('created_at'),
+                sa.column('category'), sa.column('amount'),
+            ).select_from(sa.table(name))
+            for name in LEDGER_TABLES
+        )).subquery()
+        day = sa.func.date(ledger.c.created_at)
+        bind.execute(
+            sa.table(
+                'daily_spend', sa.column('user_id'), sa.column('day'),
+                sa.column('category'), sa.column('amount'), sa.column('tx_count'),
+            ).insert().from_select(
+                ['user_id', 'day', 'category', 'amount', 'tx_count'],
+                sa.select(
+                    ledger.c.user_id, day, ledger.c.category,
+                    sa.func.sum(-ledger.c.amount),
+                    sa.func.sum(sa.case((ledger.c.amount < 0, 1), else_=0)),
+                ).where(
+                    ledger.c.category.in_(SPEND_CATEGORIES), ledger.c.created_at.isnot(None)
+                ).group_by(ledger.c.user_id, day, ledger.c.category)
+            )
+        )
+
+
+def downgrade():
+    for name in reversed(LEDGER_TABLES):
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.drop_column('reference')
+            batch_op.drop_column('category')
+    op.drop_table('daily_spend')
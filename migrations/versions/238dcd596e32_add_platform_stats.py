@@ -0,0 +1,37 @@
+"""add platform_stats aggregate table
+
+Revision ID: 238dcd596e32
+Revises: 8073a828d523
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '238dcd596e32'
+down_revision = '8073a828d523'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('platform_stats',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # seed from the existing data so the counters start out correct
+    op.execute("INSERT INTO platform_stats (name, value) SELECT 'users', COUNT(*) FROM users")
+    op.execute("INSERT INTO platform_stats (name, value) SELECT 'vouchers', COUNT(*) FROM vouchers")
+    op.execute("INSERT INTO platform_stats (name, value) SELECT 'vouchers_redeemed', COUNT(*) FROM vouchers WHERE status = 'redeemed'")
+    op.execute("INSERT INTO platform_stats (name, value) SELECT 'payments', COUNT(*) FROM merchant_payments")
+    op.execute("INSERT INTO platform_stats (name, value) SELECT 'payments_paid', COUNT(*) FROM merchant_payments WHERE status = 'paid'")
+    op.execute("INSERT INTO platform_stats (name, value) SELECT 'orders', COUNT(*) FROM marketplace_orders")
+    op.execute("INSERT INTO platform_stats (name, value) SELECT 'wallet_balance', COALESCE(SUM(wallet_balance), 0) FROM users")
+
+
+def downgrade():
+    op.drop_table('platform_stats')
@@ -0,0 +1,76 @@
+"""product category + full-text search index
+
+Revision ID: 292173048bd2
+Revises: a0c987740735
+Create Date: 2026-10-17 11:26:09.337410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '292173048bd2'
+down_revision = 'a0c987740735'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('category', sa.String(length=50), nullable=True))
+        batch_op.create_index('ix_products_category_id', ['category', 'id'], unique=False)
+        batch_op.create_index('ix_products_store_id_id', ['store_id', 'id'], unique=False)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # generated column: Postgres keeps it in sync on every insert/update
+        op.execute(
+            "ALTER TABLE products ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+            ") STORED"
+        )
+        op.execute("CREATE INDEX ix_products_search_vector ON products USING GIN (search_vector)")
+    elif dialect == 'sqlite':
+        # external-content FTS5 table, kept in sync by triggers
+        op.execute(
+            "CREATE VIRTUAL TABLE products_fts USING fts5("
+            "title, description, content='products', content_rowid='id')"
+        )
+        op.execute(
+            "CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN "
+            "INSERT INTO products_fts(rowid, title, description) "
+            "VALUES (new.id, new.title, new.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN "
+            "INSERT INTO products_fts(products_fts, rowid, title, description) "
+            "VALUES ('delete', old.id, old.title, old.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER products_fts_au AFTER UPDATE OF title, description ON products BEGIN "
+            "INSERT INTO products_fts(products_fts, rowid, title, description) "
+            "VALUES ('delete', old.id, old.title, old.description); "
+            "INSERT INTO products_fts(rowid, title, description) "
+            "VALUES (new.id, new.title, new.description); END"
+        )
+        op.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_products_search_vector")
+        op.execute("ALTER TABLE products DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS products_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_ai")
+        op.execute("DROP TABLE IF EXISTS products_fts")
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_store_id_id')
+        batch_op.drop_index('ix_products_category_id')
+        batch_op.drop_column('category')
@@ -0,0 +1,34 @@
+"""add backfill_progress checkpoints for resumable backfills
+
+Revision ID: 32d88014e61a
+Revises: 132cdef52149
+Create Date: 2026-10-17 23:48:30.520930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '32d88014e61a'
+down_revision = '132cdef52149'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('backfill_progress',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('last_id', sa.BigInteger(), nullable=False),
+    sa.Column('max_id', sa.BigInteger(), nullable=False),
+    sa.Column('rows_done', sa.BigInteger(), nullable=False),
+    sa.Column('batches', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('backfill_progress')
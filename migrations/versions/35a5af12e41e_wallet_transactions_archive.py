@@ -0,0 +1,40 @@
+"""add wallet_transactions_archive for hot/cold ledger archival
+
+Revision ID: 35a5af12e41e
+Revises: 4f6d4fd8c7b3
+Create Date: 2026-10-17 23:43:19.666608
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '35a5af12e41e'
+down_revision = '4f6d4fd8c7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('wallet_transactions_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(length=100), nullable=True),
+    sa.Column('amount', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_wallet_transactions_archive_user_created',
+        'wallet_transactions_archive',
+        ['user_id', sa.text('created_at DESC'), 'id'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_wallet_transactions_archive_user_created', table_name='wallet_transactions_archive')
+    op.drop_table('wallet_transactions_archive')
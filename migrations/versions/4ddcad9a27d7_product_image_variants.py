@@ -0,0 +1,28 @@
+"""product image variants
+
+Revision ID: 4ddcad9a27d7
+Revises: f0400fc9b85a
+Create Date: 2026-10-17 14:21:07.384552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4ddcad9a27d7'
+down_revision = 'f0400fc9b85a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_variants', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('image_status', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_column('image_status')
+        batch_op.drop_column('image_variants')
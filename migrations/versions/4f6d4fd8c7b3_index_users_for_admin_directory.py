@@ -0,0 +1,41 @@
+"""index users for the admin directory
+
+Revision ID: 4f6d4fd8c7b3
+Revises: da154fdca0bf
+Create Date: 2026-10-17 23:41:04.571750
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f6d4fd8c7b3'
+down_revision = 'da154fdca0bf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_users_created',
+        'users',
+        [sa.text('created_at DESC'), 'id'],
+        unique=False
+    )
+    # phone LIKE 'prefix%' can only use a btree under a non-C collation with
+    # pattern ops; SQLite range-scans the unique phone index instead
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index(
+            'ix_users_phone_pattern',
+            'users',
+            ['phone'],
+            unique=False,
+            postgresql_ops={'phone': 'text_pattern_ops'}
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_users_phone_pattern', table_name='users')
+    op.drop_index('ix_users_created', table_name='users')
@@ -0,0 +1,26 @@
+"""product image processing start time
+
+Revision ID: 6a84c1b01625
+Revises: 32d88014e61a
+Create Date: 2026-10-18 00:13:12.235074
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a84c1b01625'
+down_revision = '32d88014e61a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_started_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_column('image_started_at')
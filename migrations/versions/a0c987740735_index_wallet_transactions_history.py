@@ -0,0 +1,29 @@
+"""index wallet_transactions for keyset history pages
+
+Revision ID: a0c987740735
+Revises: 238dcd596e32
+Create Date: 2026-10-17 10:03:27.540911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a0c987740735'
+down_revision = '238dcd596e32'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_wallet_transactions_user_created',
+        'wallet_transactions',
+        ['user_id', sa.text('created_at DESC'), 'id'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_wallet_transactions_user_created', table_name='wallet_transactions')
@@ -0,0 +1,36 @@
+"""index merchant payments and vouchers for statement exports
+
+Revision ID: da154fdca0bf
+Revises: 4ddcad9a27d7
+Create Date: 2026-10-17 23:39:37.372105
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'da154fdca0bf'
+down_revision = '4ddcad9a27d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_merchant_payments_merchant_created',
+        'merchant_payments',
+        ['merchant_id', 'created_at', 'id'],
+        unique=False
+    )
+    op.create_index(
+        'ix_vouchers_creator_created',
+        'vouchers',
+        ['creator_id', 'created_at', 'id'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_vouchers_creator_created', table_name='vouchers')
+    op.drop_index('ix_merchant_payments_merchant_created', table_name='merchant_payments')
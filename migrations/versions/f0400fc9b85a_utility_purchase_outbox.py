@@ -0,0 +1,36 @@
+"""utility purchase outbox columns
+
+Revision ID: f0400fc9b85a
+Revises: fc030ec2cf77
+Create Date: 2026-10-17 13:02:41.660213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f0400fc9b85a'
+down_revision = 'fc030ec2cf77'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('utility_purchases', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('lease_until', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('provider_ref', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('error', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('completed_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_utility_purchases_status_lease', ['status', 'lease_until'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('utility_purchases', schema=None) as batch_op:
+        batch_op.drop_index('ix_utility_purchases_status_lease')
+        batch_op.drop_column('completed_at')
+        batch_op.drop_column('error')
+        batch_op.drop_column('provider_ref')
+        batch_op.drop_column('lease_until')
+        batch_op.drop_column('attempts')
@@ -1,6 +1,13 @@
+import time
+
+_start = time.perf_counter()
+
 from app import create_app
 
 app = create_app()
 
+# import + create_app cost, logged by gunicorn.conf.py when preloaded
+load_seconds = time.perf_counter() - _start
+
 if __name__ == "__main__":
     app.run()